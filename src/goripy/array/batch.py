@@ -32,3 +32,114 @@ def compute_batch_instance_index_limits(
         batch_instance_idx_limit_arr[:-1].copy(),
         batch_instance_idx_limit_arr[1:].copy()
     )
+
+
+
+def compute_bucketed_batch_instance_idxs(
+    instance_len_arr,
+    max_batch_num_elems,
+    num_buckets=8,
+    bucket_limit_arr=None,
+    max_batch_size=None,
+    shuffle=True,
+    seed=None
+):
+    """
+    Generates batches of instances with similar lengths, under a maximum number of elements
+    per batch (padding included).
+
+    Instances are first grouped into length buckets. Each bucket is packed greedily in length
+    order, cutting a batch when adding the next instance would make its size times its running
+    maximum length exceed the budget, so padded batches never exceed it while short instances
+    fill larger batches. Instances longer than the budget are placed in single-instance batches.
+
+    Args:
+
+        instance_len_arr (numpy.ndarray):
+            1D numpy array with the length of each instance, e.g. the `value_len_arr` of a
+            `goripy.store.varlen2dlist.VariableLength2DListStorage`.
+
+        max_batch_num_elems (int):
+            Maximum number of elements per batch, computed as the batch size times the length
+            of the longest instance in the batch.
+
+        num_buckets (int, optional):
+            Number of length buckets, with limits at length quantiles. Ignored if
+            `bucket_limit_arr` is provided.
+            Defaults to 8.
+
+        bucket_limit_arr (numpy.ndarray, optional):
+            1D numpy array with ascending bucket upper length limits (inclusive). Instances
+            longer than the last limit are placed in an extra bucket.
+            Defaults to None.
+
+        max_batch_size (int, optional):
+            Maximum allowed batch size. If not provided, only the element budget applies.
+            Defaults to None.
+
+        shuffle (bool, optional):
+            Whether to shuffle instances of equal length and batches across buckets.
+            If False, batches are ordered by bucket and length.
+            Defaults to True.
+
+        seed (int, optional):
+            Seed for shuffling. If not provided, shuffling is not deterministic.
+            Defaults to None.
+
+    Returns:
+
+        list of numpy.ndarray:
+            List with a 1D numpy array of instance indices for each batch.
+    """
+
+    instance_len_arr = numpy.asarray(instance_len_arr)
+    rng = numpy.random.default_rng(seed)
+
+    if bucket_limit_arr is None:
+        bucket_limit_arr = numpy.quantile(
+            instance_len_arr,
+            numpy.linspace(0, 1, num_buckets + 1)[1:-1]
+        ) if instance_len_arr.shape[0] > 0 else numpy.zeros(shape=(0))
+
+    instance_bucket_arr = numpy.searchsorted(bucket_limit_arr, instance_len_arr, side="left")
+
+    # Sort instances by bucket, and within each bucket by length, breaking ties randomly
+
+    if shuffle:
+        instance_key_arr = rng.permutation(instance_len_arr.shape[0])
+    else:
+        instance_key_arr = numpy.arange(instance_len_arr.shape[0])
+
+    sort_idxs = numpy.lexsort((instance_key_arr, instance_len_arr, instance_bucket_arr))
+    bucket_start_idxs = numpy.flatnonzero(numpy.diff(instance_bucket_arr[sort_idxs], prepend=-1))
+    bucket_end_idxs = numpy.append(bucket_start_idxs[1:], sort_idxs.shape[0])
+
+    batch_idxs_list = []
+
+    for bucket_start_idx, bucket_end_idx in zip(bucket_start_idxs, bucket_end_idxs):
+
+        bucket_idxs = sort_idxs[bucket_start_idx:bucket_end_idx]
+        bucket_len_arr = numpy.maximum(instance_len_arr[bucket_idxs], 1)
+
+        batch_start_idx = 0
+
+        while batch_start_idx < bucket_idxs.shape[0]:
+
+            # Lengths are ascending, so the running maximum length is the last instance length
+
+            max_batch_len = max(1, max_batch_num_elems // int(bucket_len_arr[batch_start_idx]))
+            if max_batch_size is not None:
+                max_batch_len = min(max_batch_len, max_batch_size)
+
+            cand_len_arr = bucket_len_arr[batch_start_idx:batch_start_idx + max_batch_len]
+            cand_num_elems_arr = numpy.arange(1, cand_len_arr.shape[0] + 1) * cand_len_arr
+
+            batch_len = max(1, numpy.count_nonzero(cand_num_elems_arr <= max_batch_num_elems))
+
+            batch_idxs_list.append(bucket_idxs[batch_start_idx:batch_start_idx + batch_len])
+            batch_start_idx += batch_len
+
+    if shuffle:
+        batch_idxs_list = [batch_idxs_list[idx] for idx in rng.permutation(len(batch_idxs_list))]
+
+    return batch_idxs_list
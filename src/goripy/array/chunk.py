@@ -1,7 +1,14 @@
 import math
+import os
+import sys
+import heapq
+import concurrent.futures
+import multiprocessing.shared_memory
 
 import numpy
 
+import goripy.tqdm
+
 
 
 def chunk_partition_size(arr, chunk_size):
@@ -101,3 +108,367 @@ def chunk_partition_num_list(my_list, num_chunks):
         [my_list[idx] for idx in idx_chunk]
         for idx_chunk in chunk_partition_num(numpy.arange(len(my_list)), num_chunks)
     ]
+
+
+
+########
+
+
+
+def compute_item_num_bytes(data):
+    """
+    Computes the number of bytes of each item of a numpy array, list or ragged storage, to be
+    used as partitioning cost.
+
+    Args:
+
+        data (numpy.ndarray, list or any):
+            Data to compute item sizes of. One of the following:
+
+            - Numpy array: Items are the sub-arrays along axis 0.
+            - Object with a `get_item_num_bytes` method, e.g. a
+              `goripy.store.varlen2dlist.VariableLength2DListStorage`.
+            - List: Items with an `nbytes` attribute (e.g. numpy arrays) use it, `bytes` and
+              `str` items use their length, and other items use `sys.getsizeof`.
+
+    Returns:
+
+        numpy.ndarray:
+            1D numpy array with the number of bytes of each item.
+    """
+
+    if isinstance(data, numpy.ndarray):
+        return numpy.full(
+            shape=(data.shape[0]),
+            fill_value=data[:1].nbytes if data.shape[0] > 0 else 0,
+            dtype=numpy.int64
+        )
+
+    if hasattr(data, "get_item_num_bytes"):
+        return numpy.asarray(data.get_item_num_bytes(), dtype=numpy.int64)
+
+    return numpy.fromiter(
+        (
+            item.nbytes if hasattr(item, "nbytes") else
+            len(item) if isinstance(item, (bytes, bytearray, str)) else
+            sys.getsizeof(item)
+            for item in data
+        ),
+        dtype=numpy.int64,
+        count=len(data)
+    )
+
+
+
+def chunk_partition_cost(cost_arr, max_chunk_cost=None, num_chunks=None, mode="contiguous"):
+    """
+    Partitions item indices into chunks with balanced total cost (e.g. number of bytes, see
+    `compute_item_num_bytes`), instead of balanced number of items.
+
+    The following modes are available:
+
+    - "contiguous": Chunks hold consecutive indices. With `max_chunk_cost`, chunks are filled
+      greedily up to the budget. With `num_chunks`, cuts are placed at even fractions of the
+      cumulative cost.
+    - "lpt": Load-balanced chunks of non-consecutive indices. Items are assigned in decreasing
+      cost order to the least loaded chunk (Longest Processing Time first). With
+      `max_chunk_cost`, chunks start as the total cost divided by the budget, and a new chunk
+      is opened whenever the least loaded one cannot take the next item within the budget.
+
+    Items costlier than `max_chunk_cost` on their own always exceed it.
+
+    Args:
+
+        cost_arr (numpy.ndarray):
+            1D numpy array with the cost of each item.
+
+        max_chunk_cost (int or float, optional):
+            Desired maximum total cost of each chunk. Incompatible with `num_chunks`.
+            Defaults to None.
+
+        num_chunks (int, optional):
+            Desired number of chunks. Incompatible with `max_chunk_cost`.
+            Defaults to None.
+
+        mode (str, optional):
+            Partitioning mode. Either "contiguous" or "lpt".
+            Defaults to "contiguous".
+
+    Returns:
+
+        tuple:
+            A 2-tuple consisting of:
+
+              - `idx_chunk_list`: List of 1D numpy arrays with the sorted item indices of each
+                chunk.
+              - `stat_dict`: Dictionary with the achieved balance. Keys are "chunk_cost_arr"
+                (total cost of each chunk), "max_cost", "mean_cost" and "imbalance" (maximum
+                over mean chunk cost).
+    """
+
+    if (max_chunk_cost is None) == (num_chunks is None):
+        raise ValueError("Exactly one of \"max_chunk_cost\" and \"num_chunks\" must be provided")
+
+    cost_arr = numpy.asarray(cost_arr)
+    cum_cost_arr = numpy.cumsum(cost_arr)
+    total_cost = cum_cost_arr[-1] if cost_arr.shape[0] > 0 else 0
+
+    if mode == "contiguous":
+
+        if num_chunks is not None:
+
+            chunk_lim_arr = numpy.searchsorted(
+                cum_cost_arr,
+                total_cost * numpy.arange(1, num_chunks) / num_chunks,
+                side="right"
+            )
+
+        else:
+
+            # Each chunk extends to the last item fitting in the budget, with at least one item
+
+            chunk_lim_list = []
+            chunk_start = 0
+
+            while chunk_start < cost_arr.shape[0]:
+                base_cost = cum_cost_arr[chunk_start - 1] if chunk_start > 0 else 0
+                max_cum_cost = base_cost + max_chunk_cost
+                chunk_end = numpy.searchsorted(cum_cost_arr, max_cum_cost, side="right")
+                chunk_end = max(int(chunk_end), chunk_start + 1)
+                chunk_lim_list.append(chunk_end)
+                chunk_start = chunk_end
+
+            chunk_lim_arr = numpy.asarray(chunk_lim_list[:-1], dtype=numpy.int64)
+
+        idx_chunk_list = numpy.split(numpy.arange(cost_arr.shape[0]), chunk_lim_arr)
+
+    elif mode == "lpt":
+
+        if num_chunks is None:
+            num_chunks = max(1, min(math.ceil(total_cost / max_chunk_cost), cost_arr.shape[0]))
+
+        chunk_heap = [(0, chunk_idx) for chunk_idx in range(num_chunks)]
+        item_chunk_arr = numpy.empty(shape=cost_arr.shape, dtype=numpy.int64)
+
+        for item_idx in numpy.argsort(-cost_arr, kind="stable").tolist():
+
+            chunk_cost, chunk_idx = heapq.heappop(chunk_heap)
+
+            # If no chunk fits the item within the budget, it goes to a new chunk
+
+            if max_chunk_cost is not None and chunk_cost > 0 and\
+                    chunk_cost + cost_arr[item_idx] > max_chunk_cost:
+                heapq.heappush(chunk_heap, (chunk_cost, chunk_idx))
+                chunk_cost, chunk_idx = 0, num_chunks
+                num_chunks += 1
+
+            item_chunk_arr[item_idx] = chunk_idx
+            heapq.heappush(chunk_heap, (chunk_cost + cost_arr[item_idx], chunk_idx))
+
+        item_idxs = numpy.argsort(item_chunk_arr, kind="stable")
+        chunk_lim_arr = numpy.cumsum(numpy.bincount(item_chunk_arr, minlength=num_chunks))[:-1]
+
+        idx_chunk_list = numpy.split(item_idxs, chunk_lim_arr)
+
+    else:
+
+        raise ValueError("Invalid mode \"{:s}\". Expected \"contiguous\" or \"lpt\"".format(mode))
+
+    chunk_cost_arr = numpy.asarray(
+        [numpy.sum(cost_arr[idx_chunk]) for idx_chunk in idx_chunk_list],
+        dtype=cost_arr.dtype
+    )
+
+    max_cost = numpy.max(chunk_cost_arr, initial=0)
+    mean_cost = numpy.mean(chunk_cost_arr) if chunk_cost_arr.shape[0] > 0 else 0
+
+    stat_dict = {
+        "chunk_cost_arr": chunk_cost_arr,
+        "max_cost": max_cost,
+        "mean_cost": mean_cost,
+        "imbalance": max_cost / mean_cost if mean_cost > 0 else 1.0
+    }
+
+    return idx_chunk_list, stat_dict
+
+
+
+########
+
+
+
+def chunked_map(
+    fn,
+    data,
+    chunk_size=None,
+    num_chunks=None,
+    backend="thread",
+    num_workers=None,
+    tqdm_freq=None,
+    tqdm_file=None
+):
+    """
+    Applies a function to chunks of a numpy array or list in parallel, yielding the results in
+    chunk order as soon as they are available.
+
+    Chunks are computed with `chunk_partition_size` or `chunk_partition_num` along axis 0.
+    With the "process" backend, numpy arrays are copied once into shared memory, and workers
+    receive views of their chunks instead of pickled copies. Lists are always pickled.
+
+    Args:
+
+        fn (callable):
+            Function to apply to each chunk. Must be picklable for the "process" backend.
+            Results that are views of a shared memory chunk are copied before being returned.
+
+        data (numpy.ndarray or list):
+            Data to split into chunks along axis 0.
+
+        chunk_size (int, optional):
+            Desired size of the chunks. Incompatible with `num_chunks`.
+            Defaults to None.
+
+        num_chunks (int, optional):
+            Desired number of chunks. Incompatible with `chunk_size`.
+            If neither is provided, one chunk per worker is used.
+            Defaults to None.
+
+        backend (str, optional):
+            Parallelization backend. Either "thread" or "process".
+            Defaults to "thread".
+
+        num_workers (int, optional):
+            Number of workers. If not provided, the number of CPUs is used.
+            Defaults to None.
+
+        tqdm_freq (int, optional):
+            Number of tqdm progress bar updates. If not provided, no progress bar is shown.
+            Defaults to None.
+
+        tqdm_file (any, optional):
+            File object to use for printing tqdm output.
+            Defaults to None.
+
+    Yields:
+
+        any:
+            The result of `fn` on each chunk, in chunk order.
+    """
+
+    if chunk_size is not None and num_chunks is not None:
+        raise ValueError("Arguments \"chunk_size\" and \"num_chunks\" are incompatible")
+
+    if backend not in ("thread", "process"):
+        raise ValueError("Invalid backend \"{:s}\". Expected \"thread\" or \"process\"".format(
+            backend
+        ))
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    data_len = data.shape[0] if isinstance(data, numpy.ndarray) else len(data)
+
+    if chunk_size is not None:
+        idx_chunk_list = chunk_partition_size(numpy.arange(data_len), chunk_size)
+    else:
+        idx_chunk_list = chunk_partition_num(numpy.arange(data_len), num_chunks or num_workers)
+
+    chunk_lim_list = [
+        (int(idx_chunk[0]), int(idx_chunk[-1]) + 1)
+        for idx_chunk in idx_chunk_list
+        if idx_chunk.shape[0] > 0
+    ]
+
+    shm = None
+
+    if backend == "thread":
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_workers)
+
+    try:
+
+        if backend == "process" and isinstance(data, numpy.ndarray) and data.dtype != object:
+
+            shm = multiprocessing.shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+            shm_arr = numpy.ndarray(shape=data.shape, dtype=data.dtype, buffer=shm.buf)
+            shm_arr[...] = data
+            del shm_arr
+
+            future_list = [
+                executor.submit(
+                    _shm_chunk_worker,
+                    fn,
+                    shm.name,
+                    data.dtype.str,
+                    data.shape,
+                    chunk_start,
+                    chunk_end
+                )
+                for chunk_start, chunk_end in chunk_lim_list
+            ]
+
+        else:
+
+            future_list = [
+                executor.submit(fn, data[chunk_start:chunk_end])
+                for chunk_start, chunk_end in chunk_lim_list
+            ]
+
+        future_iter = iter(future_list)
+        if tqdm_freq is not None:
+            future_iter = goripy.tqdm.tqdmidify(
+                future_iter,
+                len(future_list),
+                tqdm_freq,
+                tqdm_file
+            )
+
+        for future in future_iter:
+            yield future.result()
+
+    finally:
+
+        executor.shutdown(wait=True, cancel_futures=True)
+
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+
+
+def _shm_chunk_worker(
+    fn,
+    shm_name,
+    dtype_str,
+    shape,
+    chunk_start,
+    chunk_end
+):
+
+    # Pool workers share the resource tracker of the parent process, which unlinks the block
+
+    try:
+        shm = multiprocessing.shared_memory.SharedMemory(name=shm_name, track=False)
+    except TypeError:
+        shm = multiprocessing.shared_memory.SharedMemory(name=shm_name)
+
+    try:
+
+        shm_arr = numpy.ndarray(shape=shape, dtype=numpy.dtype(dtype_str), buffer=shm.buf)
+        chunk_arr = shm_arr[chunk_start:chunk_end]
+
+        res = fn(chunk_arr)
+
+        # Results must not reference shared memory once it is closed
+
+        if isinstance(res, numpy.ndarray) and numpy.shares_memory(res, shm_arr):
+            res = res.copy()
+
+        del shm_arr, chunk_arr
+
+    finally:
+
+        shm.close()
+
+    return res
@@ -1,3 +1,5 @@
+import concurrent.futures
+
 import numpy
 
 import goripy.memory.info
@@ -6,7 +8,10 @@ import goripy.memory.info
 
 def sprint_array_info(
     array,
-    name=None
+    name=None,
+    stats=False,
+    block_num_elems=1 << 22,
+    num_threads=None
 ):
     """
     Prints array information to a string.
@@ -20,6 +25,18 @@ def sprint_array_info(
             Name of the array variable.
             If not provided, name will not be shown.
 
+        stats (bool, optional):
+            Whether to also print value statistics, computed with `compute_array_stats`.
+            Defaults to False.
+
+        block_num_elems (int, optional):
+            Approximate number of elements per block for `compute_array_stats`.
+            Defaults to 4194304.
+
+        num_threads (int, optional):
+            Number of threads for `compute_array_stats`.
+            Defaults to None.
+
     Returns:
 
         str:
@@ -37,4 +54,172 @@ def sprint_array_info(
     array_info_str += ", "
     array_info_str += "mem: " + goripy.memory.info.sprint_fancy_num_bytes(array.nbytes)
 
+    if stats:
+
+        stat_dict = compute_array_stats(
+            array,
+            block_num_elems=block_num_elems,
+            num_threads=num_threads
+        )
+
+        array_info_str += ", "
+        array_info_str += "min: {:.6g}".format(stat_dict["min"])
+        array_info_str += ", "
+        array_info_str += "max: {:.6g}".format(stat_dict["max"])
+        array_info_str += ", "
+        array_info_str += "mean: {:.6g}".format(stat_dict["mean"])
+        array_info_str += ", "
+        array_info_str += "std: {:.6g}".format(stat_dict["std"])
+        array_info_str += ", "
+        array_info_str += "nans: {:d}".format(stat_dict["nan_count"])
+        array_info_str += ", "
+        array_info_str += "zeros: {:.2f}%".format(100 * stat_dict["zero_frac"])
+
     return array_info_str
+
+
+
+def compute_array_stats(
+    array,
+    block_num_elems=1 << 22,
+    num_threads=None
+):
+    """
+    Computes value statistics of an array, walking it in blocks along axis 0.
+
+    Only one block is loaded at a time per thread, so it is suitable for large memory-mapped
+    arrays. Partial moments of each block are merged with the pairwise update formulas of
+    Chan et al., which are numerically stable. NaN values are counted, and excluded from all
+    other statistics.
+
+    Args:
+
+        array (numpy.ndarray):
+            Array to compute statistics of. Must have a numerical or boolean dtype.
+
+        block_num_elems (int, optional):
+            Approximate number of elements per block.
+            Defaults to 4194304.
+
+        num_threads (int, optional):
+            Number of threads to process blocks with. If None, blocks are processed in the
+            calling thread.
+            Defaults to None.
+
+    Returns:
+
+        dict:
+            Dictionary with the following keys:
+
+              - "count" (int): Number of non-NaN values.
+              - "nan_count" (int): Number of NaN values.
+              - "zero_count" (int): Number of zero values.
+              - "zero_frac" (float): Fraction of zero values over all values.
+              - "min" (float): Minimum value.
+              - "max" (float): Maximum value.
+              - "mean" (float): Mean value.
+              - "std" (float): Population standard deviation.
+
+            Statistics without values are NaN.
+    """
+
+    if array.ndim == 0:
+        array = array.reshape(1)
+
+    row_num_elems = max(array.size // max(array.shape[0], 1), 1)
+    block_num_rows = max(block_num_elems // row_num_elems, 1)
+
+    block_lim_list = [
+        (block_start, min(block_start + block_num_rows, array.shape[0]))
+        for block_start in range(0, array.shape[0], block_num_rows)
+    ]
+
+    def compute_block_stats(block_lims):
+        return _compute_block_stats(array[block_lims[0]:block_lims[1]])
+
+    if num_threads is None:
+        block_stats_list = [compute_block_stats(block_lims) for block_lims in block_lim_list]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+            block_stats_list = list(executor.map(compute_block_stats, block_lim_list))
+
+    stats = (0, 0.0, 0.0, numpy.inf, -numpy.inf, 0, 0)
+    for block_stats in block_stats_list:
+        stats = _merge_block_stats(stats, block_stats)
+
+    count, mean, m2, min_val, max_val, nan_count, zero_count = stats
+    total_count = count + nan_count
+
+    return {
+        "count": count,
+        "nan_count": nan_count,
+        "zero_count": zero_count,
+        "zero_frac": zero_count / total_count if total_count > 0 else numpy.nan,
+        "min": min_val if count > 0 else numpy.nan,
+        "max": max_val if count > 0 else numpy.nan,
+        "mean": mean if count > 0 else numpy.nan,
+        "std": float(numpy.sqrt(m2 / count)) if count > 0 else numpy.nan
+    }
+
+
+
+def _compute_block_stats(
+    block_arr
+):
+
+    block_arr = numpy.asarray(block_arr)
+
+    if numpy.issubdtype(block_arr.dtype, numpy.inexact):
+        is_nan_arr = numpy.isnan(block_arr)
+        nan_count = int(numpy.count_nonzero(is_nan_arr))
+        val_arr = block_arr[~is_nan_arr] if nan_count > 0 else block_arr.ravel()
+    else:
+        nan_count = 0
+        val_arr = block_arr.ravel()
+
+    count = val_arr.size
+
+    if count == 0:
+        return (0, 0.0, 0.0, numpy.inf, -numpy.inf, nan_count, 0)
+
+    val_arr = val_arr.astype(numpy.float64)
+    mean = float(numpy.mean(val_arr))
+
+    return (
+        count,
+        mean,
+        float(numpy.sum(numpy.square(val_arr - mean))),
+        float(numpy.min(val_arr)),
+        float(numpy.max(val_arr)),
+        nan_count,
+        count - int(numpy.count_nonzero(val_arr))
+    )
+
+
+
+def _merge_block_stats(
+    stats_1,
+    stats_2
+):
+
+    count_1, mean_1, m2_1, min_1, max_1, nan_count_1, zero_count_1 = stats_1
+    count_2, mean_2, m2_2, min_2, max_2, nan_count_2, zero_count_2 = stats_2
+
+    count = count_1 + count_2
+
+    if count == 0:
+        mean, m2 = 0.0, 0.0
+    else:
+        delta = mean_2 - mean_1
+        mean = mean_1 + delta * count_2 / count
+        m2 = m2_1 + m2_2 + delta * delta * count_1 * count_2 / count
+
+    return (
+        count,
+        mean,
+        m2,
+        min(min_1, min_2),
+        max(max_1, max_2),
+        nan_count_1 + nan_count_2,
+        zero_count_1 + zero_count_2
+    )
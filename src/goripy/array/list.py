@@ -1,3 +1,5 @@
+import itertools
+
 import numpy
 
 
@@ -6,7 +8,8 @@ def llist_to_arrr(
     llist,
     arrr_dtype,
     arrr_dim1_size=None,
-    arrr_inv_val=None
+    arrr_inv_val=None,
+    arrr_out=None
 ):
     """
     Creates a 2D numpy array and fills it with data coming from a 2D list.
@@ -27,16 +30,40 @@ def llist_to_arrr(
             Valid to use as padding in the resulting array. If not provided, the maximum value of
             the numpy dtype will be used. Must be provided if the numpy dtype is neither integer
             or floating.    
+
+        arrr_out (numpy.ndarray, optional):
+            Preallocated 2D numpy array to fill in place, e.g. to reuse the same buffer across
+            batches. Must have as many rows as the 2D list, and if `arrr_dim1_size` is provided,
+            that many columns. If not provided, a new array is allocated.
         
     Returns:
 
         numpy.ndarray:
-            Resulting numpy array filled with the 2D list data.
+            Resulting numpy array filled with the 2D list data, i.e. `arrr_out` if provided.
     """
 
 
+    llist_len_arr = numpy.fromiter(map(len, llist), dtype=numpy.int64, count=len(llist))
+
+    if arrr_out is not None:
+
+        if arrr_out.ndim != 2 or arrr_out.shape[0] != len(llist) or\
+            (arrr_dim1_size is not None and arrr_out.shape[1] != arrr_dim1_size):
+            raise ValueError("Output array shape {:s} does not match the 2D list".format(
+                str(arrr_out.shape)
+            ))
+
+        arrr_dtype = arrr_out.dtype
+        arrr_dim1_size = arrr_out.shape[1]
+
     if arrr_dim1_size is None:
-        arrr_dim1_size = max(len(llist_el) for llist_el in llist)
+        arrr_dim1_size = int(numpy.max(llist_len_arr, initial=0))
+
+    if numpy.any(llist_len_arr > arrr_dim1_size):
+        raise ValueError("Sublist of length {:d} does not fit in axis 1 size {:d}".format(
+            int(numpy.max(llist_len_arr)),
+            arrr_dim1_size
+        ))
 
     #
 
@@ -56,13 +83,30 @@ def llist_to_arrr(
 
     #
 
-    arrr = numpy.full(
-        shape=(len(llist), arrr_dim1_size),
-        dtype=arrr_dtype,
-        fill_value=arrr_inv_val
-    )
+    if arrr_out is None:
+        arrr = numpy.full(
+            shape=(len(llist), arrr_dim1_size),
+            dtype=arrr_dtype,
+            fill_value=arrr_inv_val
+        )
+    else:
+        arrr = arrr_out
+        arrr.fill(arrr_inv_val)
+
+    # Flatten all sublists at once and scatter them with a single assignment
+
+    num_vals = int(numpy.sum(llist_len_arr))
+    llist_chain = itertools.chain.from_iterable(llist)
+
+    if numpy.dtype(arrr.dtype).kind in "biufc":
+        val_arr = numpy.fromiter(llist_chain, dtype=arrr.dtype, count=num_vals)
+    else:
+        val_arr = numpy.asarray(list(llist_chain), dtype=arrr.dtype)
+
+    row_idxs = numpy.repeat(numpy.arange(len(llist)), llist_len_arr)
+    col_idxs = numpy.arange(num_vals) -\
+        numpy.repeat(numpy.cumsum(llist_len_arr) - llist_len_arr, llist_len_arr)
 
-    for idx, llist_el in enumerate(llist):
-        arrr[idx, :len(llist_el)] = llist_el
+    arrr[row_idxs, col_idxs] = val_arr
     
     return arrr
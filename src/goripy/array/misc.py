@@ -2,10 +2,121 @@ import numpy
 
 
 
+class ValueIndex:
+    """
+    Indexes the first occurrence of each value of an array, for fast repeated lookups.
+
+    The index is built once with `numpy.unique`, and lookups are answered with a binary search
+    over the sorted unique values, so looking up M values in an array of N elements costs
+    O((N + M) log N) instead of O(N * M).
+
+    Args:
+
+        arr (numpy.ndarray):
+            1D original array to index.
+    """
+
+
+    def __init__(
+        self,
+        arr
+    ):
+
+        arr = numpy.asarray(arr)
+
+        self._uniq_val_arr, self._uniq_zidx_arr = numpy.unique(arr, return_index=True)
+        self._size = arr.shape[0]
+
+
+    def __len__(
+        self
+    ):
+
+        return self._size
+
+
+    @property
+    def uniq_vals(
+        self
+    ):
+        """
+        numpy.ndarray: Sorted unique values of the indexed array.
+        """
+
+        return self._uniq_val_arr
+
+
+    def lookup(
+        self,
+        vals,
+        missing="raise",
+        sentinel=-1
+    ):
+        """
+        Computes the indices of the first occurrence of values in the indexed array.
+
+        Args:
+
+            vals (numpy.ndarray):
+                Array with the values to search. Can have any shape.
+
+            missing (str, optional):
+                Policy for values not found in the indexed array. One of the following:
+
+                - "raise": Raise a ValueError.
+                - "sentinel": Use `sentinel` as their index.
+                - "mask": Use `sentinel` as their index, and also return a boolean found mask.
+
+                Defaults to "raise".
+
+            sentinel (int, optional):
+                Index to use for missing values.
+                Defaults to -1.
+
+        Returns:
+
+            numpy.ndarray or tuple:
+                The computed first occurrence indices, with the same shape as `vals`.
+                The following satisfies: `arr[zidxs] = vals`, for found values.
+                If `missing` is "mask", a 2-tuple consisting of:
+
+                  - `zidxs`: The computed first occurrence indices.
+                  - `found_arr`: Boolean array, True for found values.
+        """
+
+        if missing not in ("raise", "sentinel", "mask"):
+            raise ValueError("Invalid missing policy \"{:s}\"".format(missing))
+
+        vals = numpy.asarray(vals)
+
+        uniq_pos_arr = numpy.searchsorted(self._uniq_val_arr, vals)
+        uniq_pos_arr = numpy.minimum(uniq_pos_arr, max(self._uniq_val_arr.shape[0] - 1, 0))
+
+        if self._uniq_val_arr.shape[0] == 0:
+            found_arr = numpy.zeros(shape=vals.shape, dtype=bool)
+            zidxs = numpy.full(shape=vals.shape, fill_value=sentinel, dtype=numpy.int64)
+        else:
+            found_arr = self._uniq_val_arr[uniq_pos_arr] == vals
+            zidxs = numpy.where(found_arr, self._uniq_zidx_arr[uniq_pos_arr], sentinel)
+
+        if missing == "raise" and not numpy.all(found_arr):
+            raise ValueError("Value {:s} not found in arr".format(
+                str(vals[~found_arr].ravel()[0])
+            ))
+
+        if missing == "mask":
+            return zidxs, found_arr
+
+        return zidxs
+
+
+
 def first_argwhere_zidxs(arr, vals):
     """
     Computes the indices of the first occurrence of values in an original array.
 
+    For repeated lookups on the same array, build a `ValueIndex` once instead.
+
     Args:
 
         arr (numpy.ndarray):
@@ -21,14 +132,7 @@ def first_argwhere_zidxs(arr, vals):
             The following satisfies: `arr[zidxs] = vals`.
     """
 
-    zidxs = []
-    for val in vals:
-        argw = numpy.argwhere(arr == val)
-        if argw.shape[0] == 0:
-            raise ValueError("Value {:s} not found in arr".format(str(val)))
-        zidxs.append(argw[0][0])
-
-    return numpy.asarray(zidxs)
+    return ValueIndex(arr).lookup(vals, missing="raise")
 
 
 
@@ -46,3 +46,205 @@ def unpad(
     )
 
     return array[dim_slices]
+
+
+
+########
+
+
+
+class BufferPool:
+    """
+    Caches numpy arrays keyed by dtype, to reuse them instead of allocating new ones.
+
+    Each key holds up to `num_buffers_per_key` flat capacity buffers, handed out in round-robin
+    order as contiguous views with the requested shape, so batches with different shapes share
+    the same memory. A buffer grows (by at least half its capacity) when a request does not fit,
+    so the pool holds at most `num_buffers_per_key` buffers per dtype, each about as large as the
+    largest request. A buffer is only reused after that many further requests with the same key,
+    and callers must be done with a buffer before it is handed out again.
+
+    Args:
+
+        num_buffers_per_key (int, optional):
+            Number of buffers per dtype key. Use 2 or more to keep the previous batch alive
+            while filling the next one.
+            Defaults to 1.
+    """
+
+
+    def __init__(
+        self,
+        num_buffers_per_key=1
+    ):
+
+        self._num_buffers_per_key = num_buffers_per_key
+
+        self._buffer_list_dict = {}
+        self._next_buffer_idx_dict = {}
+
+
+    def get_buffer(
+        self,
+        shape,
+        dtype
+    ):
+        """
+        Gets a buffer with the given shape and dtype. Its contents are not initialized.
+
+        Args:
+
+            shape (tuple of int):
+                Shape of the buffer.
+
+            dtype (numpy.dtype):
+                Dtype of the buffer.
+
+        Returns:
+
+            numpy.ndarray:
+                The buffer, as a contiguous view of a cached capacity buffer.
+        """
+
+        shape = tuple(int(dim_size) for dim_size in shape)
+        key = numpy.dtype(dtype)
+
+        size = 1
+        for dim_size in shape:
+            size *= dim_size
+
+        buffer_list = self._buffer_list_dict.setdefault(key, [])
+        buffer_idx = self._next_buffer_idx_dict.get(key, 0)
+
+        if buffer_idx == len(buffer_list):
+            buffer_list.append(numpy.empty(shape=(size), dtype=key))
+        elif buffer_list[buffer_idx].shape[0] < size:
+            capacity = buffer_list[buffer_idx].shape[0]
+            buffer_list[buffer_idx] = numpy.empty(shape=(max(size, capacity * 3 // 2)), dtype=key)
+
+        self._next_buffer_idx_dict[key] = (buffer_idx + 1) % self._num_buffers_per_key
+
+        return buffer_list[buffer_idx][:size].reshape(shape)
+
+
+    def clear(
+        self
+    ):
+        """
+        Releases all cached buffers.
+        """
+
+        self._buffer_list_dict.clear()
+        self._next_buffer_idx_dict.clear()
+
+
+    def get_num_bytes(
+        self
+    ):
+        """
+        Computes the RAM memory overhead of this object.
+
+        Returns:
+
+            int:
+                Number of bytes occupied by the cached buffers.
+        """
+
+        return sum(
+            buffer.nbytes
+            for buffer_list in self._buffer_list_dict.values()
+            for buffer in buffer_list
+        )
+
+
+
+def pad_batch(
+    array_list,
+    pad_val=0,
+    pad_shape=None,
+    buffer_pool=None
+):
+    """
+    Pads arrays with the same number of dimensions at the end of each axis to a common shape,
+    and stacks them into a batch.
+
+    Args:
+
+        array_list (list of numpy.ndarray):
+            Arrays to pad and stack. Must have the same number of dimensions and dtype.
+
+        pad_val (any, optional):
+            Value to pad with.
+            Defaults to 0.
+
+        pad_shape (tuple of int, optional):
+            Common shape to pad to. If not provided, the maximum size of each axis is used.
+            Defaults to None.
+
+        buffer_pool (BufferPool, optional):
+            Pool to take the batch array from. If not provided, a new array is allocated.
+            Defaults to None.
+
+    Returns:
+
+        tuple:
+            A 2-tuple consisting of:
+
+              - `batch_arr`: The padded batch array (N x ...).
+              - `shape_arr`: 2D numpy array (N x D) with the original shape of each array.
+    """
+
+    if len(array_list) == 0:
+        raise ValueError("Cannot pad an empty list of arrays")
+
+    shape_arr = numpy.asarray([array.shape for array in array_list], dtype=numpy.int64)
+    shape_arr = shape_arr.reshape(len(array_list), array_list[0].ndim)
+
+    if pad_shape is None:
+        pad_shape = tuple(numpy.max(shape_arr, axis=0).tolist())
+
+    if numpy.any(shape_arr > numpy.asarray(pad_shape)):
+        raise ValueError("Arrays do not fit in pad shape {:s}".format(str(tuple(pad_shape))))
+
+    batch_shape = (len(array_list),) + tuple(pad_shape)
+    batch_dtype = array_list[0].dtype
+
+    if buffer_pool is None:
+        batch_arr = numpy.empty(shape=batch_shape, dtype=batch_dtype)
+    else:
+        batch_arr = buffer_pool.get_buffer(batch_shape, batch_dtype)
+
+    batch_arr.fill(pad_val)
+
+    for idx, array in enumerate(array_list):
+        batch_arr[(idx,) + tuple(slice(0, dim_size) for dim_size in array.shape)] = array
+
+    return batch_arr, shape_arr
+
+
+
+def unpad_batch(
+    batch_arr,
+    shape_arr
+):
+    """
+    Crops each array of a padded batch back to its original shape. Inverse of `pad_batch`.
+
+    Args:
+
+        batch_arr (numpy.ndarray):
+            The padded batch array (N x ...).
+
+        shape_arr (numpy.ndarray):
+            2D numpy array (N x D) with the original shape of each array.
+
+    Returns:
+
+        list of numpy.ndarray:
+            The unpadded arrays, as views of `batch_arr`.
+    """
+
+    return [
+        batch_arr[(idx,) + tuple(slice(0, dim_size) for dim_size in shape)]
+        for idx, shape in enumerate(numpy.asarray(shape_arr).tolist())
+    ]
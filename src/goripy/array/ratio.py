@@ -1,3 +1,5 @@
+import itertools
+
 import numpy
 
 
@@ -36,3 +38,142 @@ def discrete_ratio_partition_sizes(total, ratios):
     if total_diff < 0: round_val_arr[argsort_diff_list_arr[total_diff:]] -= 1
 
     return round_val_arr
+
+
+
+def stratified_ratio_partition_idxs(
+    label_data,
+    ratios,
+    group_arr=None,
+    seed=None
+):
+    """
+    Splits multi-label items into partitions with given ratios, preserving the frequency of
+    each label across partitions as much as possible.
+
+    Vectorized variant of iterative stratification: each item (or group of items) is assigned
+    to its rarest label, so that rare labels are stratified first and are not dominated by
+    frequent ones. Items assigned to each label are randomly ordered and cut proportionally to
+    the ratios, by cumulative item count, starting at a random phase so that rounding does not
+    favour any partition. Items without labels are split the same way.
+
+    Args:
+
+        label_data (any):
+            Item labels. One of the following:
+
+            - Sparse matrix (N x L) with a `tocoo` method, e.g. from `scipy.sparse`.
+            - Dense boolean 2D numpy array (N x L).
+            - List of N sequences with the label indices of each item.
+
+        ratios (numpy.ndarray):
+            The ratios for each partition.
+            All ratios will automatically be normalized to sum up to 1.
+
+        group_arr (numpy.ndarray, optional):
+            1D numpy array (N) with a group ID for each item. Items sharing a group ID are placed
+            in the same partition, and are stratified together with the union of their labels.
+            Defaults to None.
+
+        seed (int, optional):
+            Seed for the random ordering. If not provided, splits are not deterministic.
+            Defaults to None.
+
+    Returns:
+
+        list of numpy.ndarray:
+            List with a sorted 1D numpy array of item indices for each partition.
+    """
+
+    rng = numpy.random.default_rng(seed)
+
+    pair_item_arr, pair_label_arr, num_items = _get_item_label_pairs(label_data)
+
+    cum_ratio_arr = numpy.cumsum(numpy.asarray(ratios, dtype=numpy.float64))
+    cum_ratio_arr /= cum_ratio_arr[-1]
+
+    # Units: groups of items that must land in the same partition
+
+    if group_arr is None:
+        item_unit_arr = numpy.arange(num_items)
+    else:
+        _, item_unit_arr = numpy.unique(numpy.asarray(group_arr), return_inverse=True)
+        item_unit_arr = item_unit_arr.ravel()
+
+    num_units = int(numpy.max(item_unit_arr, initial=-1)) + 1
+    unit_size_arr = numpy.bincount(item_unit_arr, minlength=num_units)
+
+    # Each unit is assigned to its rarest label, unlabeled units to a last pseudo-label
+
+    num_labels = int(numpy.max(pair_label_arr, initial=-1)) + 1
+
+    pair_key_arr = numpy.unique(item_unit_arr[pair_item_arr] * num_labels + pair_label_arr)
+    pair_unit_arr = pair_key_arr // max(num_labels, 1)
+    pair_label_arr = pair_key_arr % max(num_labels, 1)
+
+    label_freq_arr = numpy.bincount(pair_label_arr, minlength=num_labels)
+    label_rank_arr = numpy.empty(shape=(num_labels), dtype=numpy.int64)
+    label_rank_arr[numpy.argsort(label_freq_arr, kind="stable")] = numpy.arange(num_labels)
+
+    unit_rank_arr = numpy.full(shape=(num_units), fill_value=num_labels, dtype=numpy.int64)
+    numpy.minimum.at(unit_rank_arr, pair_unit_arr, label_rank_arr[pair_label_arr])
+
+    # Random order within each label, and proportional cuts by cumulative unit size
+
+    sort_idxs = numpy.lexsort((rng.random(num_units), unit_rank_arr))
+    sort_rank_arr = unit_rank_arr[sort_idxs]
+    sort_size_arr = unit_size_arr[sort_idxs]
+
+    rank_total_arr = numpy.bincount(sort_rank_arr, sort_size_arr, minlength=num_labels + 1)
+    rank_offset_arr = numpy.cumsum(rank_total_arr) - rank_total_arr
+    rank_phase_arr = rng.random(num_labels + 1)
+
+    sort_cum_mid_arr = numpy.cumsum(sort_size_arr) - sort_size_arr / 2
+    sort_cum_mid_arr -= rank_offset_arr[sort_rank_arr]
+    sort_frac_arr = numpy.mod(
+        sort_cum_mid_arr / rank_total_arr[sort_rank_arr] + rank_phase_arr[sort_rank_arr],
+        1.0
+    )
+
+    unit_part_arr = numpy.empty(shape=(num_units), dtype=numpy.int64)
+    unit_part_arr[sort_idxs] = numpy.minimum(
+        numpy.searchsorted(cum_ratio_arr, sort_frac_arr, side="right"),
+        cum_ratio_arr.shape[0] - 1
+    )
+
+    item_part_arr = unit_part_arr[item_unit_arr]
+
+    return [
+        numpy.flatnonzero(item_part_arr == part_idx)
+        for part_idx in range(cum_ratio_arr.shape[0])
+    ]
+
+
+
+def _get_item_label_pairs(
+    label_data
+):
+
+    if hasattr(label_data, "tocoo"):
+        label_coo = label_data.tocoo()
+        pair_sel_arr = numpy.asarray(label_coo.data) != 0
+        return (
+            numpy.asarray(label_coo.row, dtype=numpy.int64)[pair_sel_arr],
+            numpy.asarray(label_coo.col, dtype=numpy.int64)[pair_sel_arr],
+            label_coo.shape[0]
+        )
+
+    if isinstance(label_data, numpy.ndarray) and label_data.ndim == 2:
+        pair_item_arr, pair_label_arr = numpy.nonzero(label_data)
+        return pair_item_arr, pair_label_arr, label_data.shape[0]
+
+    item_len_arr = numpy.fromiter(map(len, label_data), dtype=numpy.int64, count=len(label_data))
+
+    pair_item_arr = numpy.repeat(numpy.arange(len(label_data)), item_len_arr)
+    pair_label_arr = numpy.fromiter(
+        itertools.chain.from_iterable(label_data),
+        dtype=numpy.int64,
+        count=int(numpy.sum(item_len_arr))
+    )
+
+    return pair_item_arr, pair_label_arr, len(label_data)
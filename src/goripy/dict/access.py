@@ -1,8 +1,18 @@
+import numpy
+
+
+
+_MISSING = object()
+
+
+
 def chain_get(my_dict, *args, default=None):
     """
     Accesses a dict object repeatedly using dict.get() multiple times.
     Accessing stops whenever a key is not found.
 
+    For repeated access with the same keys, build a `PathAccessor` once instead.
+
     Args:
 
         my_dict (dict):
@@ -21,14 +31,159 @@ def chain_get(my_dict, *args, default=None):
             The accessed dict value or the default return object if not found.
     """
 
-    key_list = list(args)
-    curr_dict = my_dict
+    return PathAccessor(args).get(my_dict, default=default)
+
+
+
+class PathAccessor:
+    """
+    Precompiled accessor for a fixed path of keys into nested dicts (or lists).
+
+    Accessing stops whenever a key is not found, i.e. on `KeyError`, `IndexError` or
+    `TypeError` (e.g. indexing a non-container value).
+
+    Args:
+
+        path (tuple or any):
+            Keys with which to access objects. A non-tuple value is used as a single key.
+    """
+
+
+    def __init__(
+        self,
+        path
+    ):
+
+        self._path = tuple(path) if isinstance(path, (tuple, list)) else (path,)
+
+
+    @property
+    def path(
+        self
+    ):
+        """
+        tuple: Keys with which objects are accessed.
+        """
+
+        return self._path
+
 
-    for key in key_list:
+    def get(
+        self,
+        obj,
+        default=None
+    ):
+        """
+        Accesses an object with the keys of this accessor.
+
+        Args:
+
+            obj (dict):
+                Object to access.
+
+            default (any, optional):
+                Default return object.
+                Defaults to None.
+
+        Returns:
+
+            any:
+                The accessed value or the default return object if not found.
+        """
 
         try:
-            curr_dict = curr_dict[key]
-        except:
+            for key in self._path:
+                obj = obj[key]
+        except (KeyError, IndexError, TypeError):
             return default
 
-    return curr_dict
\ No newline at end of file
+        return obj
+
+
+    def __call__(
+        self,
+        obj,
+        default=None
+    ):
+
+        return self.get(obj, default=default)
+
+
+
+def extract_columns(records, paths, dtypes, defaults=None):
+    """
+    Extracts values at multiple paths from a list of nested dicts into numpy arrays, in a
+    single pass over the records.
+
+    Args:
+
+        records (list of dict):
+            Records to extract values from.
+
+        paths (list):
+            Paths of the values to extract, as accepted by `PathAccessor`.
+
+        dtypes (list of numpy.dtype or numpy.dtype):
+            Dtype of each resulting array, or a single dtype for all of them.
+
+        defaults (list or any, optional):
+            Value to use for missing values in each resulting array, or a single value for all
+            of them. If not provided, zero (cast to each dtype) is used.
+            Defaults to None.
+
+    Returns:
+
+        tuple:
+            A 2-tuple consisting of:
+
+              - `col_arr_list`: List with a 1D numpy array (N) of values for each path.
+              - `missing_arr_list`: List with a 1D boolean numpy array (N) for each path, True
+                for records where the path was not found.
+    """
+
+    num_cols = len(paths)
+
+    if not isinstance(dtypes, (list, tuple)):
+        dtypes = [dtypes] * num_cols
+
+    if not isinstance(defaults, (list, tuple)):
+        defaults = [defaults] * num_cols
+
+    defaults = [
+        numpy.zeros(shape=(), dtype=dtype).item() if default is None else default
+        for dtype, default in zip(dtypes, defaults)
+    ]
+
+    accessor_list = [PathAccessor(path) for path in paths]
+
+    col_val_llist = [[] for _ in range(num_cols)]
+    col_missing_idx_llist = [[] for _ in range(num_cols)]
+
+    col_spec_list = list(zip(
+        accessor_list,
+        defaults,
+        col_val_llist,
+        col_missing_idx_llist
+    ))
+
+    for record_idx, record in enumerate(records):
+        for accessor, default, col_val_list, col_missing_idx_list in col_spec_list:
+            value = accessor.get(record, default=_MISSING)
+            if value is _MISSING:
+                col_missing_idx_list.append(record_idx)
+                value = default
+            col_val_list.append(value)
+
+    col_arr_list = []
+    missing_arr_list = []
+
+    for col_val_list, col_missing_idx_list, dtype in\
+        zip(col_val_llist, col_missing_idx_llist, dtypes):
+
+        col_arr_list.append(numpy.asarray(col_val_list, dtype=dtype))
+
+        missing_arr = numpy.zeros(shape=(len(col_val_list)), dtype=bool)
+        missing_arr[col_missing_idx_list] = True
+        missing_arr_list.append(missing_arr)
+
+    return col_arr_list, missing_arr_list
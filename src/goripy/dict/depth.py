@@ -99,3 +99,315 @@ def _unflatten_recursive(
             nest_dict[key] = flat_dict[value]
 
     return nest_dict
+
+
+
+########
+
+
+
+def flatten_paths(
+    nest_dict,
+    sep=None
+):
+    """
+    Flattens a dict so that it is only one level deep, using leaf paths as keys.
+
+    Unlike `flatten`, keys are deterministic, so flattened dicts can be cached and compared.
+    Nested dicts are traversed iteratively in insertion order. Empty nested dicts are kept as
+    leaf values.
+
+    Args:
+
+        nest_dict (dict):
+            Nested dict to flatten.
+
+        sep (str, optional):
+            Separator to join path keys with. If not provided, paths are tuples of keys.
+            Defaults to None.
+
+    Returns:
+
+        dict:
+            The flattened dict, mapping each leaf path to its value.
+    """
+
+    flat_dict = {}
+
+    for path, value in _iter_leaf_paths(nest_dict):
+        flat_dict[path if sep is None else sep.join(map(str, path))] = value
+
+    return flat_dict
+
+
+
+def unflatten_paths(
+    flat_dict,
+    sep=None
+):
+    """
+    Inverse of the `flatten_paths` method.
+
+    Args:
+
+        flat_dict (dict):
+            The flattened dict produced by `flatten_paths`.
+
+        sep (str, optional):
+            Separator used to join path keys. Must match the one given to `flatten_paths`.
+            Joined paths are split into string keys.
+            Defaults to None.
+
+    Returns:
+
+        dict:
+            The original nested dict.
+    """
+
+    nest_dict = {}
+
+    for path, value in flat_dict.items():
+
+        if sep is not None:
+            path = path.split(sep)
+
+        sub_dict = nest_dict
+        for key in path[:-1]:
+            sub_dict = sub_dict.setdefault(key, {})
+
+        sub_dict[path[-1]] = value
+
+    return nest_dict
+
+
+
+class PathKeyMap:
+    """
+    Compact, reusable key map for nested dicts with the same structure.
+
+    Built once from a reference dict, it converts dicts with the same structure into flat lists
+    of leaf values and back, without storing or hashing any path keys.
+    Nested dicts are traversed iteratively in insertion order, and empty nested dicts are kept
+    as leaf values, as in `flatten_paths`.
+
+    Args:
+
+        node_op_list (list of tuple):
+            Reconstruction operations, in traversal order. Each one is a 3-tuple with the index
+            of the parent dict node, the key, and whether the key holds a nested dict node
+            (True) or a leaf value (False).
+    """
+
+
+    def __init__(
+        self,
+        node_op_list
+    ):
+
+        self._node_op_list = node_op_list
+        self._num_leaves = sum(1 for _, _, is_node in node_op_list if not is_node)
+
+        self._node_num_keys_list = [0]
+        for node_idx, _, is_node in node_op_list:
+            self._node_num_keys_list[node_idx] += 1
+            if is_node:
+                self._node_num_keys_list.append(0)
+
+
+    def __len__(
+        self
+    ):
+
+        return self._num_leaves
+
+
+    @classmethod
+    def from_dict(
+        cls,
+        nest_dict
+    ):
+        """
+        Creates a PathKeyMap from the structure of a reference nested dict.
+
+        Args:
+
+            nest_dict (dict):
+                Reference nested dict.
+
+        Returns:
+
+            PathKeyMap:
+                The created key map object.
+        """
+
+        return cls([
+            (node_idx, key, is_node)
+            for node_idx, key, is_node, _ in _iter_node_ops(nest_dict)
+        ])
+
+
+    def get_paths(
+        self
+    ):
+        """
+        Computes the path of each leaf, in value list order.
+
+        Returns:
+
+            list of tuple:
+                The leaf paths, as tuples of keys.
+        """
+
+        node_path_list = [()]
+        leaf_path_list = []
+
+        for node_idx, key, is_node in self._node_op_list:
+            if is_node:
+                node_path_list.append(node_path_list[node_idx] + (key,))
+            else:
+                leaf_path_list.append(node_path_list[node_idx] + (key,))
+
+        return leaf_path_list
+
+
+    def flatten_values(
+        self,
+        nest_dict
+    ):
+        """
+        Flattens a nested dict with the structure of this key map into a list of leaf values.
+
+        Values are read by key following the structure of this key map, so the key order of
+        the nested dict does not matter. A KeyError is raised if a key of this key map is
+        missing, and a ValueError if the nested dict has extra keys, or a leaf value where this
+        key map expects a nested dict (or vice versa).
+
+        Args:
+
+            nest_dict (dict):
+                Nested dict to flatten.
+
+        Returns:
+
+            list:
+                The leaf values, in key map order.
+        """
+
+        node_list = [nest_dict]
+        value_list = []
+
+        for node_idx, key, is_node in self._node_op_list:
+
+            value = node_list[node_idx][key]
+            is_value_node = type(value) is dict and len(value) > 0
+
+            if is_value_node != is_node:
+                raise ValueError("Key {:s} holds a {:s}, but key map expects a {:s}".format(
+                    str(key),
+                    "nested dict" if is_value_node else "leaf value",
+                    "nested dict" if is_node else "leaf value"
+                ))
+
+            if is_node:
+                node_list.append(value)
+            else:
+                value_list.append(value)
+
+        for node, num_keys in zip(node_list, self._node_num_keys_list):
+            if len(node) != num_keys:
+                raise ValueError("Dict has keys not in key map: {:s}".format(
+                    str(list(node.keys()))
+                ))
+
+        return value_list
+
+
+    def unflatten_values(
+        self,
+        value_list
+    ):
+        """
+        Inverse of the `flatten_values` method.
+
+        Args:
+
+            value_list (list):
+                The leaf values, in traversal order.
+
+        Returns:
+
+            dict:
+                The nested dict.
+        """
+
+        if len(value_list) != self._num_leaves:
+            raise ValueError("Got {:d} values for key map with {:d} leaves".format(
+                len(value_list),
+                self._num_leaves
+            ))
+
+        node_list = [{}]
+        value_iter = iter(value_list)
+
+        for node_idx, key, is_node in self._node_op_list:
+            if is_node:
+                node = {}
+                node_list[node_idx][key] = node
+                node_list.append(node)
+            else:
+                node_list[node_idx][key] = next(value_iter)
+
+        return node_list[0]
+
+
+
+def _iter_node_ops(
+    nest_dict
+):
+
+    item_iter_stack = [iter(nest_dict.items())]
+    node_idx_stack = [0]
+    num_nodes = 1
+
+    while len(item_iter_stack) > 0:
+
+        for key, value in item_iter_stack[-1]:
+
+            if type(value) is dict and len(value) > 0:
+                yield node_idx_stack[-1], key, True, None
+                item_iter_stack.append(iter(value.items()))
+                node_idx_stack.append(num_nodes)
+                num_nodes += 1
+                break
+
+            yield node_idx_stack[-1], key, False, value
+
+        else:
+
+            item_iter_stack.pop()
+            node_idx_stack.pop()
+
+
+
+def _iter_leaf_paths(
+    nest_dict
+):
+
+    item_iter_stack = [iter(nest_dict.items())]
+    path_stack = [()]
+
+    while len(item_iter_stack) > 0:
+
+        for key, value in item_iter_stack[-1]:
+
+            if type(value) is dict and len(value) > 0:
+                item_iter_stack.append(iter(value.items()))
+                path_stack.append(path_stack[-1] + (key,))
+                break
+
+            yield path_stack[-1] + (key,), value
+
+        else:
+
+            item_iter_stack.pop()
+            path_stack.pop()
@@ -0,0 +1,236 @@
+import json
+import struct
+
+import numpy
+
+import goripy.dict.depth
+
+
+
+########
+
+
+
+ARRAY_DICT_MAGIC = b"\x93GAD"
+"""
+bytes: Magic bytes at the start of array dict files.
+"""
+
+ARRAY_DICT_VERSION = 1
+"""
+int: Latest array dict file format version.
+"""
+
+ARRAY_DICT_ALIGNMENT = 64
+"""
+int: Alignment in bytes of the header end and of each array data block.
+"""
+
+_ARRAY_DICT_PREAMBLE_STRUCT = struct.Struct("<4sIQ")
+
+
+
+########
+
+
+
+def save_array_dict(
+    array_dict,
+    filename
+):
+    """
+    Saves a nested dict of numpy arrays, scalars and strings into a single file.
+
+    The file starts with a preamble (magic bytes, format version and header length), followed
+    by a JSON header describing each leaf by its path (see `goripy.dict.depth.flatten_paths`),
+    and by the raw data of each array, aligned to `ARRAY_DICT_ALIGNMENT` bytes so that arrays
+    can be memory-mapped on load. Numpy scalars are stored as 0-d arrays, and dtypes (including
+    nested and aligned structured dtypes) are stored as in the `.npy` format, so that arrays load
+    with the exact same shape and dtype. Python scalars and strings are stored in the JSON header.
+
+    Args:
+
+        array_dict (dict):
+            Nested dict to save. Leaves must be numpy arrays (without `object` dtype), numpy
+            scalars, or JSON-serializable scalars (`bool`, `int`, `float`, `str`, `None`).
+            Keys must be strings or integers.
+
+        filename (str):
+            Filename to save to.
+    """
+
+    leaf_list = []
+    array_list = []
+
+    data_offset = 0
+
+    for path, value in goripy.dict.depth.flatten_paths(array_dict).items():
+
+        if isinstance(value, (numpy.ndarray, numpy.generic)):
+
+            array = numpy.require(numpy.asarray(value), requirements="C")
+
+            if array.dtype.hasobject:
+                raise ValueError("Array at path {:s} has unsupported dtype {:s}".format(
+                    str(path),
+                    str(array.dtype)
+                ))
+
+            leaf_list.append({
+                "path": list(path),
+                "kind": "array",
+                "dtype": numpy.lib.format.dtype_to_descr(array.dtype),
+                "shape": list(array.shape),
+                "offset": data_offset
+            })
+            array_list.append(array)
+
+            data_offset += _align(array.nbytes)
+
+        elif type(value) is dict:
+
+            leaf_list.append({"path": list(path), "kind": "dict"})
+
+        elif value is None or isinstance(value, (bool, int, float, str)):
+
+            leaf_list.append({"path": list(path), "kind": "value", "value": value})
+
+        else:
+
+            raise ValueError("Value at path {:s} has unsupported type {:s}".format(
+                str(path),
+                str(type(value))
+            ))
+
+    header_bytes = json.dumps({"leaves": leaf_list}).encode("utf-8")
+
+    header_end = _ARRAY_DICT_PREAMBLE_STRUCT.size + len(header_bytes)
+    header_bytes += b" " * (_align(header_end) - header_end)
+
+    with open(filename, "wb") as array_dict_file:
+
+        array_dict_file.write(_ARRAY_DICT_PREAMBLE_STRUCT.pack(
+            ARRAY_DICT_MAGIC,
+            ARRAY_DICT_VERSION,
+            len(header_bytes)
+        ))
+        array_dict_file.write(header_bytes)
+
+        for array in array_list:
+            array_dict_file.write(array.tobytes())
+            array_dict_file.write(b"\x00" * (_align(array.nbytes) - array.nbytes))
+
+
+
+def load_array_dict(
+    filename,
+    mmap_mode="r"
+):
+    """
+    Loads a nested dict of numpy arrays, scalars and strings from a single file.
+    Inverse of the `save_array_dict` method.
+
+    Arrays are loaded lazily as views of a memory map of the file, so only the data that is
+    accessed is actually read.
+
+    Args:
+
+        filename (str):
+            Filename to load from.
+
+        mmap_mode (str, optional):
+            Memory map mode, as in `numpy.memmap` ("r", "r+" or "c"). If None, all arrays are
+            read into memory.
+            Defaults to "r".
+
+    Returns:
+
+        dict:
+            The loaded nested dict.
+    """
+
+    with open(filename, "rb") as array_dict_file:
+
+        magic, version, header_len = _ARRAY_DICT_PREAMBLE_STRUCT.unpack(
+            array_dict_file.read(_ARRAY_DICT_PREAMBLE_STRUCT.size)
+        )
+
+        if magic != ARRAY_DICT_MAGIC:
+            raise ValueError("File {:s} is not an array dict file".format(filename))
+
+        if version != 1:
+            raise ValueError("Unsupported array dict file version: {:d}".format(version))
+
+        header_dict = json.loads(array_dict_file.read(header_len).decode("utf-8"))
+
+    data_start = _ARRAY_DICT_PREAMBLE_STRUCT.size + header_len
+
+    if mmap_mode is None:
+        with open(filename, "rb") as array_dict_file:
+            array_dict_file.seek(data_start)
+            data_arr = numpy.frombuffer(array_dict_file.read(), dtype=numpy.uint8)
+    elif any(leaf["kind"] == "array" for leaf in header_dict["leaves"]):
+        data_arr = numpy.memmap(filename, dtype=numpy.uint8, mode=mmap_mode)[data_start:]
+    else:
+        data_arr = numpy.zeros(shape=(0), dtype=numpy.uint8)
+
+    flat_dict = {}
+
+    for leaf in header_dict["leaves"]:
+
+        path = tuple(leaf["path"])
+
+        if leaf["kind"] == "array":
+
+            dtype = numpy.lib.format.descr_to_dtype(_json_to_descr(leaf["dtype"]))
+            shape = tuple(leaf["shape"])
+            num_bytes = dtype.itemsize * int(numpy.prod(shape, dtype=numpy.int64))
+
+            array = data_arr[leaf["offset"]:leaf["offset"] + num_bytes].view(dtype).reshape(shape)
+            if mmap_mode is None:
+                array = array.copy()
+
+            flat_dict[path] = array
+
+        elif leaf["kind"] == "dict":
+
+            flat_dict[path] = {}
+
+        else:
+
+            flat_dict[path] = leaf["value"]
+
+    return goripy.dict.depth.unflatten_paths(flat_dict)
+
+
+
+########
+
+
+
+def _align(
+    num_bytes
+):
+
+    return -(-num_bytes // ARRAY_DICT_ALIGNMENT) * ARRAY_DICT_ALIGNMENT
+
+
+
+def _json_to_descr(
+    descr
+):
+
+    # JSON turns the tuples of structured descrs into lists: fields (name, descr[, shape]),
+    # titled names (title, name) and subarray shapes
+
+    if not isinstance(descr, list):
+        return descr
+
+    return [
+        (
+            tuple(field[0]) if isinstance(field[0], list) else field[0],
+            _json_to_descr(field[1]),
+            *[tuple(shape) for shape in field[2:]]
+        )
+        for field in descr
+    ]
@@ -2,12 +2,43 @@ import numpy
 
 
 
+def proj_to_limits(proj_arr):
+    """
+    Computes the limits of the `True` values of boolean projection arrays.
+    Projections without `True` values yield (0, 0) limits.
+
+    Args:
+
+        proj_arr (numpy.ndarray):
+            Boolean projection array(s), e.g. `numpy.any(mask, axis=0)`.
+            Shape: (L) or (... x L). Dtype: `bool`.
+
+    Returns:
+
+        2-tuple of numpy.ndarray:
+            The starting (inclusive) and ending (exclusive) limits along the last axis.
+    """
+
+    proj_len = proj_arr.shape[-1]
+    is_nonempty_arr = numpy.any(proj_arr, axis=-1)
+
+    lim0_arr = numpy.argmax(proj_arr, axis=-1)
+    lim1_arr = proj_len - numpy.argmax(proj_arr[..., ::-1], axis=-1)
+
+    lim0_arr = numpy.where(is_nonempty_arr, lim0_arr, 0)
+    lim1_arr = numpy.where(is_nonempty_arr, lim1_arr, 0)
+
+    return lim0_arr, lim1_arr
+
+
+
 def mask_to_bbox(mask):
     """
     Computes bbox limits from a binary mask.
+    Empty masks yield (0, 0, 0, 0) limits.
 
     Args:
-    
+
         mask (numpy.ndarray):
             2D boolean numpy array (H x W).
 
@@ -17,14 +48,112 @@ def mask_to_bbox(mask):
             The bbox limits (x0, y0, x1, y1).
     """
 
-    mask_x = numpy.any(mask, axis=0)
-    x0, x1 = 0, mask_x.shape[0]
-    while not mask_x[x0]: x0 += 1
-    while not mask_x[x1 - 1]: x1 -= 1
+    x0, x1 = proj_to_limits(numpy.any(mask, axis=0))
+    y0, y1 = proj_to_limits(numpy.any(mask, axis=1))
+
+    return x0.item(), y0.item(), x1.item(), y1.item()
+
+
+
+def masks_to_bboxes(masks):
+    """
+    Computes bbox limits from a stack of binary masks.
+    Empty masks yield (0, 0, 0, 0) limits.
+
+    Args:
+
+        masks (numpy.ndarray):
+            3D boolean numpy array (N x H x W).
+
+    Returns:
+
+        numpy.ndarray:
+            2D numpy array (N x 4) with each mask bbox limits (x0, y0, x1, y1).
+    """
+
+    x0_arr, x1_arr = proj_to_limits(numpy.any(masks, axis=1))
+    y0_arr, y1_arr = proj_to_limits(numpy.any(masks, axis=2))
+
+    return numpy.stack([x0_arr, y0_arr, x1_arr, y1_arr], axis=1)
+
+
+
+def label_map_to_bboxes(label_map, bkg_label=0):
+    """
+    Computes bbox limits, areas and centroids of all instances in an instance label map.
+    All instances are processed in a single pass over the label map.
+
+    Args:
+
+        label_map (numpy.ndarray):
+            2D integer numpy array (H x W) with the instance label of each pixel.
+
+        bkg_label (int, optional):
+            Label of background pixels, which are ignored.
+            If None, all labels are treated as instances.
+            Defaults to 0.
+
+    Returns:
+
+        tuple:
+            A 4-tuple consisting of:
+
+              - `label_arr`: 1D numpy array (K) with the sorted instance labels.
+              - `bbox_arr`: 2D numpy array (K x 4) with each instance bbox limits
+                (x0, y0, x1, y1).
+              - `area_arr`: 1D numpy array (K) with each instance area.
+              - `centroid_arr`: 2D numpy array (K x 2) with each instance centroid (x, y).
+    """
+
+    img_w = label_map.shape[1]
+    label_map_flat = label_map.ravel()
+
+    if bkg_label is None:
+        pix_idx_arr = numpy.arange(label_map_flat.shape[0])
+    else:
+        pix_idx_arr = numpy.flatnonzero(label_map_flat != bkg_label)
+
+    if pix_idx_arr.shape[0] == 0:
+        return (
+            numpy.empty(shape=(0), dtype=label_map.dtype),
+            numpy.empty(shape=(0, 4), dtype=numpy.int64),
+            numpy.empty(shape=(0), dtype=numpy.int64),
+            numpy.empty(shape=(0, 2), dtype=numpy.float64)
+        )
+
+    # Sort pixels by label, keeping them in row-major order within each label
+
+    pix_label_arr = label_map_flat[pix_idx_arr]
+    sort_idxs = numpy.argsort(pix_label_arr, kind="stable")
+
+    pix_label_arr = pix_label_arr[sort_idxs]
+    pix_idx_arr = pix_idx_arr[sort_idxs]
+    pix_y_arr, pix_x_arr = numpy.divmod(pix_idx_arr, img_w)
+
+    label_start_arr = numpy.concatenate([
+        numpy.asarray([0]),
+        numpy.flatnonzero(pix_label_arr[1:] != pix_label_arr[:-1]) + 1
+    ])
+    label_end_arr = numpy.concatenate([
+        label_start_arr[1:],
+        numpy.asarray([pix_label_arr.shape[0]])
+    ])
+
+    # Compute per-label statistics
+
+    label_arr = pix_label_arr[label_start_arr]
+    area_arr = label_end_arr - label_start_arr
+
+    bbox_arr = numpy.stack([
+        numpy.minimum.reduceat(pix_x_arr, label_start_arr),
+        pix_y_arr[label_start_arr],
+        numpy.maximum.reduceat(pix_x_arr, label_start_arr) + 1,
+        pix_y_arr[label_end_arr - 1] + 1
+    ], axis=1)
 
-    mask_y = numpy.any(mask, axis=1)
-    y0, y1 = 0, mask_y.shape[0]
-    while not mask_y[y0]: y0 += 1
-    while not mask_y[y1 - 1]: y1 -= 1
+    centroid_arr = numpy.stack([
+        numpy.add.reduceat(pix_x_arr, label_start_arr, dtype=numpy.float64),
+        numpy.add.reduceat(pix_y_arr, label_start_arr, dtype=numpy.float64)
+    ], axis=1) / area_arr[:, None]
 
-    return x0, y0, x1, y1
+    return label_arr, bbox_arr, area_arr, centroid_arr
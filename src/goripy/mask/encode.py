@@ -1,38 +1,124 @@
 import base64
+import struct
 
 import numpy
 
+import goripy.mask.packed
 from goripy.mask.rle import mask_to_rle, rle_to_mask
 
 
 
+########
+
+
+
+MASK_CODEC_MAGIC = b"\x93GMK"
+"""
+bytes: Magic bytes at the start of versioned mask payloads.
+The leading byte is not a valid Base64 character, and no legacy payload can start with these
+bytes, so versioned and legacy payloads are never confused.
+"""
+
+MASK_CODEC_VERSION = 1
+"""
+int: Latest mask codec version. Version 0 refers to the legacy format.
+"""
+
+MASK_BATCH_CODEC_MAGIC = b"\x93GMB"
+"""
+bytes: Magic bytes at the start of multi-mask payloads.
+"""
+
+MASK_BATCH_CODEC_VERSION = 1
+"""
+int: Latest multi-mask codec version.
+"""
+
+_MASK_BATCH_HEADER_STRUCT = struct.Struct("<4sBBBxIII")
+_MASK_BATCH_FLAG_BBOX = 0x01
+_MASK_BATCH_FLAG_SCORE = 0x02
+
+
+
+########
+
+
+
 def encode_mask(
-    mask
+    mask,
+    version=MASK_CODEC_VERSION,
+    use_b64=True
 ):
     """
     Encodes a binary mask into a Base64 string. Useful for HTTP data transfer.
-    
+
     Internally encodes the mask RLE encoding into a Base64 string.
+    The following codec versions are available:
+
+    - Version 0 (legacy): Raw uint32 RLE runs followed by an 8-character decimal shape string.
+      Limited to mask dimensions of up to 9999.
+    - Version 1: Magic bytes and version byte, followed by the mask height, width, number of RLE
+      runs and the RLE runs themselves, all encoded as LEB128 varints.
 
     Args:
 
         mask (numpy.ndarray):
             Binary mask to encode.
             Shape: (H x W). Dtype: `bool`.
-        
+
+        version (int, optional):
+            Codec version to use.
+            Defaults to the latest version.
+
+        use_b64 (bool, optional):
+            Whether to Base64-encode the payload. If False, the raw payload bytes are returned,
+            which is useful for binary transports. Only supported for version 1 onwards.
+            Defaults to True.
+
     Returns:
 
-        str:
-            The Base64 string encoding the binary mask.
+        str or bytes:
+            The Base64 string encoding the binary mask, or the raw payload bytes if `use_b64`
+            is False.
     """
 
     rle_arr = mask_to_rle(mask)
-    rle_bytes = rle_arr.tobytes()
-    
-    shape_str = "{:04d}{:04d}".format(mask.shape[0], mask.shape[1])
-    shape_bytes = shape_str.encode()
-    
-    b64_bytes = base64.b64encode(rle_bytes + shape_bytes)
+
+    if version == 0:
+
+        if not use_b64:
+            raise ValueError("Legacy mask codec version 0 only supports Base64 output")
+
+        if max(mask.shape) > 9999:
+            raise ValueError("Legacy mask codec version 0 does not support mask shape {:s}".format(
+                str(mask.shape)
+            ))
+
+        rle_bytes = rle_arr.tobytes()
+
+        shape_str = "{:04d}{:04d}".format(mask.shape[0], mask.shape[1])
+        shape_bytes = shape_str.encode()
+
+        payload_bytes = rle_bytes + shape_bytes
+
+    elif version == 1:
+
+        header_bytes = MASK_CODEC_MAGIC + bytes([version])
+        body_bytes = _encode_leb128(numpy.concatenate([
+            numpy.asarray([mask.shape[0], mask.shape[1], rle_arr.shape[0]], dtype=numpy.uint64),
+            rle_arr.astype(numpy.uint64)
+        ]))
+
+        payload_bytes = header_bytes + body_bytes
+
+    else:
+
+        raise ValueError("Unsupported mask codec version: {:d}".format(version))
+
+    if not use_b64:
+        return payload_bytes
+
+    b64_bytes = base64.b64encode(payload_bytes)
     b64_str = b64_bytes.decode("ascii")
 
     return b64_str
@@ -40,32 +126,373 @@ def encode_mask(
 
 
 def decode_mask(
-    b64_str
+    payload
 ):
     """
     Decodes a binary mask from a Base64 string. Useful for HTTP data transfer.
 
-    Decoding method associated to the `decode_mask` encoding method.
+    Decoding method associated to the `encode_mask` encoding method.
+    All codec versions, including the legacy one, are detected automatically.
 
     Args:
 
-        b64_str (str):
-            Base64 string encoding the binary mask.
-        
+        payload (str or bytes):
+            Base64 string encoding the binary mask, or raw payload bytes produced by
+            `encode_mask` with `use_b64` set to False.
+
     Returns:
 
         numpy.ndarray:
             The decoded binary mask.
             Shape: (H x W). Dtype: `bool`.
     """
-    
-    b64_bytes = base64.b64decode(b64_str)
 
-    rle_arr = numpy.frombuffer(b64_bytes[:-8], dtype=numpy.uint32)
+    if isinstance(payload, (bytes, bytearray, memoryview)) and\
+        bytes(payload[:len(MASK_CODEC_MAGIC)]) == MASK_CODEC_MAGIC:
+        payload_bytes = bytes(payload)
+    else:
+        payload_bytes = base64.b64decode(payload)
+
+    if payload_bytes[:len(MASK_CODEC_MAGIC)] != MASK_CODEC_MAGIC:
+        return _decode_mask_legacy(payload_bytes)
+
+    version = payload_bytes[len(MASK_CODEC_MAGIC)]
+
+    if version == 1:
+
+        val_arr = _decode_leb128(payload_bytes[len(MASK_CODEC_MAGIC) + 1:])
+
+        shape = (int(val_arr[0]), int(val_arr[1]))
+        num_runs = int(val_arr[2])
+
+        if val_arr.shape[0] != 3 + num_runs:
+            raise ValueError("Corrupted mask payload: expected {:d} RLE runs, found {:d}".format(
+                num_runs,
+                val_arr.shape[0] - 3
+            ))
+
+        rle_arr = val_arr[3:].astype(numpy.uint32)
 
-    shape_str = b64_bytes[-8:].decode()
+    else:
+
+        raise ValueError("Unsupported mask codec version: {:d}".format(version))
+
+    mask = rle_to_mask(rle_arr, shape)
+
+    return mask
+
+
+
+def _decode_mask_legacy(
+    payload_bytes
+):
+
+    rle_arr = numpy.frombuffer(payload_bytes[:-8], dtype=numpy.uint32)
+
+    shape_str = payload_bytes[-8:].decode()
     shape = (int(shape_str[-8:-4]), int(shape_str[-4:]))
 
     mask = rle_to_mask(rle_arr, shape)
 
     return mask
+
+
+
+########
+
+
+
+def encode_masks(
+    masks,
+    shape=None,
+    bbox_arr=None,
+    score_arr=None,
+    use_b64=True
+):
+    """
+    Encodes multiple binary masks with a shared shape into a single payload, optionally along
+    with per-mask bboxes and scores. Useful for HTTP data transfer.
+
+    The payload starts with magic bytes, a version byte, the RLE run dtype, flags for the
+    optional fields, and the mask height, width and number of masks. It is followed by the
+    number of runs of each mask, the optional bboxes (int32) and scores (float32), and all RLE
+    runs concatenated with the narrowest unsigned dtype that fits them.
+    All sections are 4-byte aligned, so they can be decoded as zero-copy views.
+
+    Args:
+
+        masks (numpy.ndarray, goripy.mask.packed.BitPackedMask or list of numpy.ndarray):
+            Masks to encode. Either a dense (N x H x W) boolean array, a (N x H x W) stack of
+            bit-packed masks, or a list of N RLE encoded masks (see `goripy.mask.rle`).
+
+        shape (2-tuple of int, optional):
+            The original dimensions of the masks (H x W). Required for RLE encoded masks.
+            Defaults to None.
+
+        bbox_arr (numpy.ndarray, optional):
+            Bboxes (x0, y0, x1, y1) of each mask.
+            Shape: (N x 4).
+            Defaults to None.
+
+        score_arr (numpy.ndarray, optional):
+            Scores of each mask.
+            Shape: (N).
+            Defaults to None.
+
+        use_b64 (bool, optional):
+            Whether to Base64-encode the payload. If False, the raw payload bytes are returned.
+            Defaults to True.
+
+    Returns:
+
+        str or bytes:
+            The Base64 string encoding the masks, or the raw payload bytes if `use_b64` is
+            False.
+    """
+
+    if isinstance(masks, goripy.mask.packed.BitPackedMask):
+        shape = masks.shape[1:]
+        rle_list = masks.to_rle() if masks.shape[0] > 0 else []
+    elif isinstance(masks, numpy.ndarray):
+        shape = masks.shape[1:]
+        rle_list = [mask_to_rle(mask) for mask in masks]
+    elif shape is not None:
+        rle_list = list(masks)
+    else:
+        raise ValueError("Mask shape is required for RLE encoded masks")
+
+    num_masks = len(rle_list)
+
+    rle_len_arr = numpy.asarray([rle.shape[0] for rle in rle_list], dtype="<u4")
+    run_arr = numpy.concatenate([numpy.zeros(shape=(0), dtype=numpy.uint32)] + rle_list)
+
+    max_run = int(numpy.max(run_arr, initial=0))
+    run_dtype = numpy.dtype("<u1" if max_run < 1 << 8 else "<u2" if max_run < 1 << 16 else "<u4")
+
+    flags = 0
+    section_bytes_list = [rle_len_arr.tobytes()]
+
+    if bbox_arr is not None:
+        flags |= _MASK_BATCH_FLAG_BBOX
+        bbox_arr = numpy.asarray(bbox_arr, dtype="<i4").reshape(num_masks, 4)
+        section_bytes_list.append(bbox_arr.tobytes())
+
+    if score_arr is not None:
+        flags |= _MASK_BATCH_FLAG_SCORE
+        score_arr = numpy.asarray(score_arr, dtype="<f4").reshape(num_masks)
+        section_bytes_list.append(score_arr.tobytes())
+
+    section_bytes_list.append(run_arr.astype(run_dtype).tobytes())
+
+    header_bytes = _MASK_BATCH_HEADER_STRUCT.pack(
+        MASK_BATCH_CODEC_MAGIC,
+        MASK_BATCH_CODEC_VERSION,
+        run_dtype.itemsize,
+        flags,
+        int(shape[0]),
+        int(shape[1]),
+        num_masks
+    )
+
+    payload_bytes = header_bytes + b"".join(section_bytes_list)
+
+    if not use_b64:
+        return payload_bytes
+
+    return base64.b64encode(payload_bytes).decode("ascii")
+
+
+
+def decode_masks(
+    payload,
+    output="rle"
+):
+    """
+    Decodes multiple binary masks from a payload. Useful for HTTP data transfer.
+
+    Decoding method associated to the `encode_masks` encoding method.
+    Bboxes, scores and RLEs are returned as views of the payload bytes, without copying.
+
+    Args:
+
+        payload (str or bytes):
+            Base64 string encoding the masks, or raw payload bytes produced by `encode_masks`
+            with `use_b64` set to False.
+
+        output (str, optional):
+            Output mask format. One of the following:
+
+            - "rle": List of RLE encoded masks (see `goripy.mask.rle`), as views of the payload
+              with its run dtype (uint8, uint16 or uint32).
+            - "packed": Stack of bit-packed masks (`goripy.mask.packed.BitPackedMask`).
+            - "mask": Dense boolean array (N x H x W).
+
+            Defaults to "rle".
+
+    Returns:
+
+        tuple:
+            A 4-tuple consisting of:
+
+              - `masks`: The decoded masks, in the `output` format.
+              - `shape`: The original dimensions of the masks (H x W).
+              - `bbox_arr`: 2D numpy array (N x 4) with the bboxes, or None if not encoded.
+              - `score_arr`: 1D numpy array (N) with the scores, or None if not encoded.
+    """
+
+    if isinstance(payload, (bytes, bytearray, memoryview)) and\
+        bytes(payload[:len(MASK_BATCH_CODEC_MAGIC)]) == MASK_BATCH_CODEC_MAGIC:
+        payload_buf = payload
+    else:
+        payload_buf = base64.b64decode(payload)
+
+    magic, version, run_itemsize, flags, mask_h, mask_w, num_masks =\
+        _MASK_BATCH_HEADER_STRUCT.unpack_from(payload_buf, 0)
+
+    if magic != MASK_BATCH_CODEC_MAGIC:
+        raise ValueError("Invalid multi-mask payload magic bytes: {:s}".format(str(magic)))
+
+    if version != 1:
+        raise ValueError("Unsupported multi-mask codec version: {:d}".format(version))
+
+    shape = (mask_h, mask_w)
+    offset = _MASK_BATCH_HEADER_STRUCT.size
+
+    rle_len_arr = numpy.frombuffer(payload_buf, dtype="<u4", count=num_masks, offset=offset)
+    offset += rle_len_arr.nbytes
+
+    bbox_arr = None
+    if flags & _MASK_BATCH_FLAG_BBOX:
+        bbox_arr = numpy.frombuffer(payload_buf, dtype="<i4", count=num_masks * 4, offset=offset)
+        bbox_arr = bbox_arr.reshape(num_masks, 4)
+        offset += bbox_arr.nbytes
+
+    score_arr = None
+    if flags & _MASK_BATCH_FLAG_SCORE:
+        score_arr = numpy.frombuffer(payload_buf, dtype="<f4", count=num_masks, offset=offset)
+        offset += score_arr.nbytes
+
+    run_arr = numpy.frombuffer(
+        payload_buf,
+        dtype="<u{:d}".format(run_itemsize),
+        count=int(numpy.sum(rle_len_arr, dtype=numpy.int64)),
+        offset=offset
+    )
+
+    if output == "rle":
+
+        rle_end_arr = numpy.cumsum(rle_len_arr, dtype=numpy.int64)
+        masks = [
+            run_arr[rle_end - rle_len:rle_end]
+            for rle_end, rle_len in zip(rle_end_arr.tolist(), rle_len_arr.tolist())
+        ]
+
+    elif output in ("packed", "mask"):
+
+        masks = _batch_runs_to_masks(run_arr, rle_len_arr, shape)
+        if output == "packed":
+            masks = goripy.mask.packed.BitPackedMask.from_mask(masks)
+
+    else:
+
+        raise ValueError("Invalid output \"{:s}\". Expected \"rle\", \"packed\" or \"mask\"".format(
+            output
+        ))
+
+    return masks, shape, bbox_arr, score_arr
+
+
+
+def _batch_runs_to_masks(
+    run_arr,
+    rle_len_arr,
+    shape
+):
+
+    num_masks = rle_len_arr.shape[0]
+    mask_size = shape[0] * shape[1]
+
+    run_mask_idx_arr = numpy.repeat(numpy.arange(num_masks), rle_len_arr)
+    run_local_idx_arr = numpy.arange(run_arr.shape[0]) -\
+        numpy.repeat(numpy.cumsum(rle_len_arr, dtype=numpy.int64) - rle_len_arr, rle_len_arr)
+
+    # Flat run limits, restarting at the start of each mask
+
+    run_end_arr = numpy.cumsum(run_arr, dtype=numpy.int64)
+    mask_run_sum_arr = numpy.bincount(run_mask_idx_arr, run_arr, minlength=num_masks)
+    mask_run_sum_arr = mask_run_sum_arr.astype(numpy.int64)
+
+    mask_offset_arr = \
+        numpy.arange(num_masks) * mask_size - (numpy.cumsum(mask_run_sum_arr) - mask_run_sum_arr)
+
+    run_end_arr += mask_offset_arr[run_mask_idx_arr]
+    run_start_arr = run_end_arr - run_arr
+
+    is_fg_arr = run_local_idx_arr % 2 == 1
+
+    delta_arr = numpy.zeros(shape=(num_masks * mask_size + 1), dtype=numpy.int8)
+    numpy.add.at(delta_arr, run_start_arr[is_fg_arr], 1)
+    numpy.add.at(delta_arr, run_end_arr[is_fg_arr], -1)
+
+    mask_flat_arr = numpy.cumsum(delta_arr[:-1], dtype=numpy.int8) > 0
+
+    return mask_flat_arr.reshape(num_masks, shape[1], shape[0]).transpose(0, 2, 1)
+
+
+
+########
+
+
+
+def _encode_leb128(
+    val_arr
+):
+
+    val_arr = numpy.asarray(val_arr, dtype=numpy.uint64)
+
+    num_bytes_arr = numpy.ones(shape=val_arr.shape, dtype=numpy.int64)
+    for num_shift_bits in range(7, 64, 7):
+        num_bytes_arr += val_arr >= numpy.uint64(1 << num_shift_bits)
+
+    byte_offset_arr = numpy.cumsum(num_bytes_arr) - num_bytes_arr
+    byte_arr = numpy.empty(shape=(int(numpy.sum(num_bytes_arr))), dtype=numpy.uint8)
+
+    for byte_idx in range(int(numpy.max(num_bytes_arr, initial=0))):
+
+        val_sel_arr = num_bytes_arr > byte_idx
+
+        byte_val_arr = (val_arr[val_sel_arr] >> numpy.uint64(7 * byte_idx)) & numpy.uint64(0x7F)
+        byte_val_arr[num_bytes_arr[val_sel_arr] > byte_idx + 1] |= numpy.uint64(0x80)
+
+        byte_arr[byte_offset_arr[val_sel_arr] + byte_idx] = byte_val_arr
+
+    return byte_arr.tobytes()
+
+
+
+def _decode_leb128(
+    leb128_bytes
+):
+
+    byte_arr = numpy.frombuffer(leb128_bytes, dtype=numpy.uint8)
+
+    if byte_arr.shape[0] == 0:
+        return numpy.empty(shape=(0), dtype=numpy.uint64)
+
+    is_last_arr = byte_arr < 0x80
+    if not is_last_arr[-1]:
+        raise ValueError("Corrupted LEB128 data: last varint is truncated")
+
+    val_start_arr = numpy.concatenate([
+        numpy.asarray([0]),
+        numpy.flatnonzero(is_last_arr[:-1]) + 1
+    ])
+    byte_val_idx_arr = numpy.concatenate([
+        numpy.asarray([0]),
+        numpy.cumsum(is_last_arr[:-1])
+    ])
+
+    byte_shift_arr = 7 * (numpy.arange(byte_arr.shape[0]) - val_start_arr[byte_val_idx_arr])
+    byte_part_arr = (byte_arr & 0x7F).astype(numpy.uint64) << byte_shift_arr.astype(numpy.uint64)
+
+    return numpy.add.reduceat(byte_part_arr, val_start_arr)
@@ -1,3 +1,7 @@
+import os
+import json
+import struct
+
 import numpy
 
 import goripy.mask.rle
@@ -36,3 +40,516 @@ def load_mask_from_rle_file(rle_filename):
 
     mask_rle_file = numpy.load(rle_filename)
     return goripy.mask.rle.rle_to_mask(mask_rle_file["mask_rle"], mask_rle_file["mask_shape"])
+
+
+
+########
+
+
+
+RLE_ARCHIVE_MAGIC = b"\x93GMA"
+"""
+bytes: Magic bytes at the start and end of RLE mask archive files.
+"""
+
+RLE_ARCHIVE_VERSION = 1
+"""
+int: Latest RLE mask archive format version.
+"""
+
+RLE_ARCHIVE_INDEX_DTYPE = numpy.dtype([
+    ("rle_offset", "<u8"),
+    ("rle_len", "<u4"),
+    ("mask_h", "<u4"),
+    ("mask_w", "<u4"),
+    ("bbox", "<i4", (4,))
+])
+"""
+numpy.dtype: Dtype of the RLE mask archive offsets index entries.
+RLE offsets are given in number of uint32 values from the start of the data section.
+Missing bboxes are stored as (-1, -1, -1, -1).
+"""
+
+_RLE_ARCHIVE_HEADER_STRUCT = struct.Struct("<4sIQ")
+_RLE_ARCHIVE_FOOTER_STRUCT = struct.Struct("<QQQQ4s")
+
+
+
+class RLEMaskArchiveWriter:
+    """
+    Writes many binary masks into a single RLE mask archive file.
+    Archive files can be read with `RLEMaskArchive`.
+
+    The archive file layout is the following:
+
+    - Header: Magic bytes, format version and position of the last committed footer.
+    - Data section: RLE runs of all masks, as uint32 values.
+    - Offsets index: One `RLE_ARCHIVE_INDEX_DTYPE` entry per mask.
+    - Metadata: JSON list with the metadata of each mask.
+    - Footer: Offsets index position, number of masks, metadata position and size, and magic
+      bytes.
+
+    The offsets index, metadata and footer are only written when calling `close`, after which
+    the header footer position is updated to commit them. In append mode, new RLE runs are
+    written after the existing footer, which is never modified, so the archive keeps its
+    previous contents readable until the appended masks are committed, even if the writer
+    crashes. Each append session leaves the previous offsets index and metadata behind as
+    unused bytes inside the data section.
+
+    Use this object as a context manager, or call `close` explicitly. Objects garbage collected
+    without being closed are closed (and committed) on deletion.
+
+    Args:
+
+        filename (str):
+            Filename of the archive.
+
+        mode (str, optional):
+            Either "w" to create a new archive (overwriting existing ones) or "a" to append masks
+            to an existing archive.
+            Defaults to "w".
+    """
+
+
+    def __init__(
+        self,
+        filename,
+        mode="w"
+    ):
+
+        if mode == "w":
+
+            self._file = open(filename, "wb")
+            self._file.write(_RLE_ARCHIVE_HEADER_STRUCT.pack(
+                RLE_ARCHIVE_MAGIC,
+                RLE_ARCHIVE_VERSION,
+                0
+            ))
+
+            self._index_arr_list = []
+            self._metadata_list = []
+            self._data_len = 0
+
+        elif mode == "a":
+
+            index_arr, metadata_list, _ = _read_rle_archive_footer(filename)
+
+            # Keep the committed footer intact, and write new runs after it, aligned to 4 bytes
+
+            self._file = open(filename, "r+b")
+
+            _, _, footer_pos = _RLE_ARCHIVE_HEADER_STRUCT.unpack(
+                self._file.read(_RLE_ARCHIVE_HEADER_STRUCT.size)
+            )
+            file_end_pos = self._file.seek(0, os.SEEK_END)
+
+            # Archives without a committed footer position get it before any new write
+
+            if footer_pos == 0:
+                self._file.seek(0)
+                self._file.write(_RLE_ARCHIVE_HEADER_STRUCT.pack(
+                    RLE_ARCHIVE_MAGIC,
+                    RLE_ARCHIVE_VERSION,
+                    file_end_pos - _RLE_ARCHIVE_FOOTER_STRUCT.size
+                ))
+                self._file.seek(file_end_pos)
+
+            self._file.write(bytes(-file_end_pos % 4))
+
+            self._index_arr_list = [index_arr]
+            self._metadata_list = metadata_list
+            self._data_len = (self._file.tell() - _RLE_ARCHIVE_HEADER_STRUCT.size) // 4
+
+        else:
+
+            raise ValueError("Invalid mode \"{:s}\". Expected \"w\" or \"a\"".format(mode))
+
+
+    def add_rle(
+        self,
+        rle,
+        shape,
+        bbox=None,
+        metadata=None
+    ):
+        """
+        Appends an RLE encoded mask (see `goripy.mask.rle`) to the archive.
+
+        Args:
+
+            rle (numpy.ndarray):
+                The encoded RLE as an array.
+                Dtype: uint32.
+
+            shape (2-tuple of int):
+                The original dimensions of the mask (H x W).
+
+            bbox (4-tuple of int, optional):
+                The mask bbox limits (x0, y0, x1, y1).
+                If not provided, no bbox is stored.
+
+            metadata (any, optional):
+                JSON-serializable metadata of the mask.
+                Defaults to None.
+        """
+
+        if self._file is None:
+            raise ValueError("Cannot add masks to a closed archive")
+
+        rle = numpy.ascontiguousarray(rle, dtype="<u4")
+        self._file.write(rle.tobytes())
+
+        index_arr = numpy.zeros(shape=(1), dtype=RLE_ARCHIVE_INDEX_DTYPE)
+        index_arr["rle_offset"] = self._data_len
+        index_arr["rle_len"] = rle.shape[0]
+        index_arr["mask_h"] = shape[0]
+        index_arr["mask_w"] = shape[1]
+        index_arr["bbox"] = -1 if bbox is None else bbox
+
+        self._index_arr_list.append(index_arr)
+        self._metadata_list.append(metadata)
+        self._data_len += rle.shape[0]
+
+
+    def add_mask(
+        self,
+        mask,
+        bbox=None,
+        metadata=None
+    ):
+        """
+        Appends a binary mask to the archive.
+
+        Args:
+
+            mask (numpy.ndarray):
+                2D boolean numpy array (H x W).
+
+            bbox (4-tuple of int, optional):
+                The mask bbox limits (x0, y0, x1, y1).
+                If not provided, no bbox is stored.
+
+            metadata (any, optional):
+                JSON-serializable metadata of the mask.
+                Defaults to None.
+        """
+
+        self.add_rle(goripy.mask.rle.mask_to_rle(mask), mask.shape, bbox=bbox, metadata=metadata)
+
+
+    def close(
+        self
+    ):
+        """
+        Writes the offsets index, metadata and footer, and closes the archive file.
+        """
+
+        if self._file is None:
+            return
+
+        # Align the offsets index to 8 bytes
+
+        data_end_pos = self._file.tell()
+        index_pos = data_end_pos + (-data_end_pos % 8)
+        self._file.write(bytes(index_pos - data_end_pos))
+
+        index_arr = numpy.concatenate(
+            [numpy.zeros(shape=(0), dtype=RLE_ARCHIVE_INDEX_DTYPE)] + self._index_arr_list
+        )
+        self._file.write(index_arr.tobytes())
+
+        metadata_pos = self._file.tell()
+        metadata_bytes = json.dumps(self._metadata_list).encode()
+        self._file.write(metadata_bytes)
+
+        footer_pos = self._file.tell()
+        self._file.write(_RLE_ARCHIVE_FOOTER_STRUCT.pack(
+            index_pos,
+            index_arr.shape[0],
+            metadata_pos,
+            len(metadata_bytes),
+            RLE_ARCHIVE_MAGIC
+        ))
+
+        # Commit the new footer only once it is fully written to disk
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._file.seek(0)
+        self._file.write(_RLE_ARCHIVE_HEADER_STRUCT.pack(
+            RLE_ARCHIVE_MAGIC,
+            RLE_ARCHIVE_VERSION,
+            footer_pos
+        ))
+
+        self._file.close()
+        self._file = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __del__(self):
+        if getattr(self, "_file", None) is not None:
+            self.close()
+
+
+
+class RLEMaskArchive:
+    """
+    Reads binary masks from an RLE mask archive file written with `RLEMaskArchiveWriter`.
+
+    The data section is memory-mapped, so only the RLE runs of the accessed masks are read from
+    disk. Indexing this object with an integer returns the decoded binary mask.
+
+    Args:
+
+        filename (str):
+            Filename of the archive.
+    """
+
+
+    def __init__(
+        self,
+        filename
+    ):
+
+        self._index_arr, self._metadata_list, data_len = _read_rle_archive_footer(filename)
+
+        if data_len > 0:
+            self._data_arr = numpy.memmap(
+                filename,
+                dtype="<u4",
+                mode="r",
+                offset=_RLE_ARCHIVE_HEADER_STRUCT.size,
+                shape=(data_len,)
+            )
+        else:
+            self._data_arr = numpy.zeros(shape=(0), dtype="<u4")
+
+
+    def __len__(
+        self
+    ):
+
+        return self._index_arr.shape[0]
+
+
+    def __getitem__(
+        self,
+        idx
+    ):
+
+        return self.get_mask(idx)
+
+
+    def __iter__(
+        self
+    ):
+
+        for idx in range(len(self)):
+            yield self.get_mask(idx)
+
+
+    def get_rle(
+        self,
+        idx
+    ):
+        """
+        Reads the RLE encoding of a mask, without decoding it.
+
+        Args:
+
+            idx (int):
+                Index of the mask in the archive.
+
+        Returns:
+
+            tuple:
+                A 2-tuple consisting of:
+
+                  - `rle`: Memory-mapped view of the mask RLE. Dtype: uint32.
+                  - `shape`: The mask dimensions (H x W).
+        """
+
+        index_entry = self._index_arr[idx]
+
+        rle_offset = int(index_entry["rle_offset"])
+        rle = self._data_arr[rle_offset:rle_offset + int(index_entry["rle_len"])]
+
+        return rle, (int(index_entry["mask_h"]), int(index_entry["mask_w"]))
+
+
+    def get_mask(
+        self,
+        idx
+    ):
+        """
+        Reads and decodes a mask.
+
+        Args:
+
+            idx (int):
+                Index of the mask in the archive.
+
+        Returns:
+
+            numpy.ndarray:
+                The decoded mask.
+                Shape: (H x W). Dtype: bool.
+        """
+
+        return goripy.mask.rle.rle_to_mask(*self.get_rle(idx))
+
+
+    def get_masks(
+        self,
+        idxs
+    ):
+        """
+        Reads and decodes a batch of masks.
+        Masks are read in storage order to minimize disk seeks.
+
+        Args:
+
+            idxs (numpy.ndarray):
+                1D array with the indices of the masks in the archive.
+
+        Returns:
+
+            list of numpy.ndarray:
+                The decoded masks, in the same order as `idxs`.
+        """
+
+        idxs = numpy.asarray(idxs)
+        mask_list = [None] * idxs.shape[0]
+
+        for pos in numpy.argsort(self._index_arr["rle_offset"][idxs], kind="stable"):
+            mask_list[pos] = self.get_mask(idxs[pos])
+
+        return mask_list
+
+
+    def get_bbox(
+        self,
+        idx
+    ):
+        """
+        Reads the bbox limits of a mask.
+
+        Args:
+
+            idx (int):
+                Index of the mask in the archive.
+
+        Returns:
+
+            tuple of int or None:
+                The bbox limits (x0, y0, x1, y1), or None if no bbox was stored.
+        """
+
+        bbox = tuple(self._index_arr["bbox"][idx].tolist())
+
+        return None if bbox == (-1, -1, -1, -1) else bbox
+
+
+    def get_bbox_arr(
+        self
+    ):
+        """
+        Reads the bbox limits of all masks.
+
+        Returns:
+
+            numpy.ndarray:
+                2D numpy array (N x 4) with each mask bbox limits (x0, y0, x1, y1).
+                Missing bboxes are filled with -1.
+        """
+
+        return self._index_arr["bbox"].copy()
+
+
+    def get_shape_arr(
+        self
+    ):
+        """
+        Reads the dimensions of all masks.
+
+        Returns:
+
+            numpy.ndarray:
+                2D numpy array (N x 2) with each mask dimensions (H x W).
+        """
+
+        return numpy.stack([self._index_arr["mask_h"], self._index_arr["mask_w"]], axis=1)
+
+
+    def get_metadata(
+        self,
+        idx
+    ):
+        """
+        Reads the metadata of a mask.
+
+        Args:
+
+            idx (int):
+                Index of the mask in the archive.
+
+        Returns:
+
+            any:
+                The mask metadata.
+        """
+
+        return self._metadata_list[idx]
+
+
+
+def _read_rle_archive_footer(
+    filename
+):
+
+    with open(filename, "rb") as archive_file:
+
+        header_bytes = archive_file.read(_RLE_ARCHIVE_HEADER_STRUCT.size)
+        magic, version, footer_pos = _RLE_ARCHIVE_HEADER_STRUCT.unpack(header_bytes)
+
+        if magic != RLE_ARCHIVE_MAGIC:
+            raise ValueError("File {:s} is not an RLE mask archive".format(filename))
+
+        if version != RLE_ARCHIVE_VERSION:
+            raise ValueError("Unsupported RLE mask archive version: {:d}".format(version))
+
+        # Archives without a committed footer position keep their footer at the end
+
+        if footer_pos > 0:
+            archive_file.seek(footer_pos)
+        else:
+            archive_file.seek(-_RLE_ARCHIVE_FOOTER_STRUCT.size, os.SEEK_END)
+
+        footer_bytes = archive_file.read(_RLE_ARCHIVE_FOOTER_STRUCT.size)
+        index_pos, num_masks, metadata_pos, metadata_len, magic =\
+            _RLE_ARCHIVE_FOOTER_STRUCT.unpack(footer_bytes)
+
+        if magic != RLE_ARCHIVE_MAGIC:
+            raise ValueError("RLE mask archive {:s} was not closed properly".format(filename))
+
+        archive_file.seek(index_pos)
+        index_arr = numpy.frombuffer(
+            archive_file.read(num_masks * RLE_ARCHIVE_INDEX_DTYPE.itemsize),
+            dtype=RLE_ARCHIVE_INDEX_DTYPE
+        ).copy()
+
+        archive_file.seek(metadata_pos)
+        metadata_list = json.loads(archive_file.read(metadata_len).decode())
+
+    data_len = (index_pos - _RLE_ARCHIVE_HEADER_STRUCT.size) // 4
+
+    return index_arr, metadata_list, data_len
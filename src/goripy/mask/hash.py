@@ -0,0 +1,362 @@
+import hashlib
+
+import numpy
+
+import goripy.mask.rle
+
+
+
+########
+
+
+
+def hash_rle(
+    rle,
+    shape
+):
+    """
+    Computes a canonical content hash of an RLE encoded mask (see `goripy.mask.rle`).
+
+    The RLE is first canonicalized (merging touching runs), so that equal masks always yield
+    equal hashes regardless of how their RLE was produced. The mask shape is part of the hash.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+        shape (2-tuple of int):
+            The original dimensions of the mask (H x W).
+
+    Returns:
+
+        str:
+            The hexadecimal mask hash (32 characters).
+    """
+
+    run_start_arr, run_end_arr = goripy.mask.rle.rle_to_runs(rle)
+    canon_rle = goripy.mask.rle.runs_to_rle(
+        run_start_arr,
+        run_end_arr,
+        int(shape[0]) * int(shape[1])
+    )
+
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(numpy.asarray(shape, dtype="<u4").tobytes())
+    hasher.update(canon_rle.astype("<u4").tobytes())
+
+    return hasher.hexdigest()
+
+
+
+def hash_mask(
+    mask
+):
+    """
+    Computes a canonical content hash of a binary mask.
+    Equivalent to `hash_rle` on the mask RLE encoding.
+
+    Args:
+
+        mask (numpy.ndarray):
+            2D boolean numpy array (H x W).
+
+    Returns:
+
+        str:
+            The hexadecimal mask hash (32 characters).
+    """
+
+    return hash_rle(goripy.mask.rle.mask_to_rle(mask), mask.shape)
+
+
+
+########
+
+
+
+class MaskDuplicateIndex:
+    """
+    Indexes RLE encoded masks (see `goripy.mask.rle`) to find duplicates and near-duplicates.
+
+    Masks are added with `add_rle` or `add_mask`, and are identified by their insertion index.
+    Exact duplicates are grouped by content hash in O(N). Near-duplicates are found by bucketing
+    masks by shape, bbox size and bbox center, and only computing RLE IoU for mask pairs in
+    neighbouring buckets that pass an IoU upper bound based on their areas and bbox overlap.
+    """
+
+
+    def __init__(
+        self
+    ):
+
+        self._hash_list = []
+        self._rle_list = []
+        self._shape_list = []
+        self._bbox_list = []
+        self._area_list = []
+
+
+    def __len__(
+        self
+    ):
+
+        return len(self._hash_list)
+
+
+    def add_rle(
+        self,
+        rle,
+        shape
+    ):
+        """
+        Adds an RLE encoded mask to the index.
+
+        Args:
+
+            rle (numpy.ndarray):
+                The encoded RLE as an array.
+                Dtype: uint32.
+
+            shape (2-tuple of int):
+                The original dimensions of the mask (H x W).
+
+        Returns:
+
+            int:
+                The index of the added mask.
+        """
+
+        shape = (int(shape[0]), int(shape[1]))
+
+        self._hash_list.append(hash_rle(rle, shape))
+        self._rle_list.append(rle)
+        self._shape_list.append(shape)
+        self._bbox_list.append(goripy.mask.rle.rle_to_bbox(rle, shape))
+        self._area_list.append(goripy.mask.rle.rle_area(rle))
+
+        return len(self._hash_list) - 1
+
+
+    def add_mask(
+        self,
+        mask
+    ):
+        """
+        Adds a binary mask to the index.
+
+        Args:
+
+            mask (numpy.ndarray):
+                2D boolean numpy array (H x W).
+
+        Returns:
+
+            int:
+                The index of the added mask.
+        """
+
+        return self.add_rle(goripy.mask.rle.mask_to_rle(mask), mask.shape)
+
+
+    def get_hash(
+        self,
+        idx
+    ):
+        """
+        Gets the content hash of an indexed mask.
+
+        Args:
+
+            idx (int):
+                Index of the mask.
+
+        Returns:
+
+            str:
+                The hexadecimal mask hash.
+        """
+
+        return self._hash_list[idx]
+
+
+    def find_exact_duplicates(
+        self
+    ):
+        """
+        Groups indexed masks with identical content.
+
+        Returns:
+
+            list of numpy.ndarray:
+                One 1D array per group of 2 or more identical masks, with their indices in
+                insertion order.
+        """
+
+        hash_idx_list_dict = {}
+        for idx, mask_hash in enumerate(self._hash_list):
+            hash_idx_list_dict.setdefault(mask_hash, []).append(idx)
+
+        return [
+            numpy.asarray(idx_list)
+            for idx_list in hash_idx_list_dict.values()
+            if len(idx_list) > 1
+        ]
+
+
+    def find_near_duplicates(
+        self,
+        iou_thresh=0.9
+    ):
+        """
+        Finds pairs of indexed masks with IoU above a threshold.
+
+        Masks with the same shape are bucketed by bbox size, in log scale with ratio
+        `1 / iou_thresh` between levels, and by bbox center, quantized to cells proportional to
+        the bbox size of their level. Only masks in the same or neighbouring buckets are
+        compared, which includes every pair whose bboxes also have IoU above the threshold,
+        regardless of mask size. Pairs whose masks overlap well but have very dissimilar bboxes
+        (e.g. due to small far away components) may be missed.
+        Exact duplicates are also reported.
+
+        Args:
+
+            iou_thresh (float, optional):
+                Minimum IoU of reported pairs, in the (0, 1] range.
+                Defaults to 0.9.
+
+        Returns:
+
+            tuple:
+                A 2-tuple consisting of:
+
+                  - `pair_arr`: 2D numpy array (K x 2) with the indices of each pair (i < j).
+                  - `iou_arr`: 1D numpy array (K) with the IoU of each pair.
+        """
+
+        num_masks = len(self)
+
+        bbox_arr = numpy.asarray(self._bbox_list, dtype=numpy.int64).reshape(num_masks, 4)
+        area_arr = numpy.asarray(self._area_list, dtype=numpy.int64)
+
+        # Bbox IoU above the threshold bounds the size ratio by 1 / thresh (so sizes fall in the
+        # same or neighbouring levels), and the center offset by (1 - thresh) times the size
+
+        bucket_thresh = min(max(iou_thresh, 1e-6), 0.99)
+        level_ratio = 1 / bucket_thresh
+
+        size_arr = numpy.maximum(
+            numpy.maximum(bbox_arr[:, 2] - bbox_arr[:, 0], bbox_arr[:, 3] - bbox_arr[:, 1]),
+            1
+        )
+        level_arr = numpy.floor(numpy.log(size_arr) / numpy.log(level_ratio)).astype(numpy.int64)
+
+        cx_arr = (bbox_arr[:, 0] + bbox_arr[:, 2]) / 2
+        cy_arr = (bbox_arr[:, 1] + bbox_arr[:, 3]) / 2
+
+        # Candidate pairs within each bucket and with its forward neighbours, on a grid per level
+        # holding masks of that level and the next one
+
+        cand_idx_a_arr_list = []
+        cand_idx_b_arr_list = []
+
+        for level in numpy.unique(level_arr).tolist():
+
+            level_idx_arr = numpy.flatnonzero((level_arr == level) | (level_arr == level + 1))
+
+            cell_size = 1.01 * (1 - bucket_thresh) * level_ratio ** (level + 2)
+            cx_q_arr = numpy.floor(cx_arr[level_idx_arr] / cell_size).astype(numpy.int64)
+            cy_q_arr = numpy.floor(cy_arr[level_idx_arr] / cell_size).astype(numpy.int64)
+
+            bucket_idx_list_dict = {}
+            for idx, cx_q, cy_q in zip(
+                level_idx_arr.tolist(),
+                cx_q_arr.tolist(),
+                cy_q_arr.tolist()
+            ):
+                bucket_key = (self._shape_list[idx], cx_q, cy_q)
+                bucket_idx_list_dict.setdefault(bucket_key, []).append(idx)
+
+            level_idx_a_arr_list = []
+            level_idx_b_arr_list = []
+
+            for (shape, cx_q, cy_q), idx_list in bucket_idx_list_dict.items():
+
+                idx_arr = numpy.asarray(idx_list)
+
+                idx_a_arr, idx_b_arr = numpy.triu_indices(idx_arr.shape[0], k=1)
+                level_idx_a_arr_list.append(idx_arr[idx_a_arr])
+                level_idx_b_arr_list.append(idx_arr[idx_b_arr])
+
+                for dcx, dcy in ((1, -1), (1, 0), (1, 1), (0, 1)):
+
+                    nbr_idx_list = bucket_idx_list_dict.get((shape, cx_q + dcx, cy_q + dcy))
+                    if nbr_idx_list is None:
+                        continue
+
+                    idx_a_arr, idx_b_arr = numpy.meshgrid(idx_arr, numpy.asarray(nbr_idx_list))
+                    level_idx_a_arr_list.append(idx_a_arr.ravel())
+                    level_idx_b_arr_list.append(idx_b_arr.ravel())
+
+            # Pairs of two masks of the next level are found on its own grid
+
+            level_idx_a_arr = numpy.concatenate(level_idx_a_arr_list)
+            level_idx_b_arr = numpy.concatenate(level_idx_b_arr_list)
+
+            level_sel_arr = numpy.minimum(level_arr[level_idx_a_arr], level_arr[level_idx_b_arr])
+            level_sel_arr = level_sel_arr == level
+
+            cand_idx_a_arr_list.append(level_idx_a_arr[level_sel_arr])
+            cand_idx_b_arr_list.append(level_idx_b_arr[level_sel_arr])
+
+        empty_idx_arr = numpy.zeros(shape=(0), dtype=numpy.int64)
+
+        cand_idx_a_arr = numpy.concatenate([empty_idx_arr] + cand_idx_a_arr_list)
+        cand_idx_b_arr = numpy.concatenate([empty_idx_arr] + cand_idx_b_arr_list)
+
+        # IoU upper bound: intersection is at most the smallest of both areas and bbox overlap
+
+        bbox_a_arr = bbox_arr[cand_idx_a_arr]
+        bbox_b_arr = bbox_arr[cand_idx_b_arr]
+
+        bbox_inter_arr = numpy.concatenate([
+            numpy.maximum(bbox_a_arr[:, :2], bbox_b_arr[:, :2]),
+            numpy.minimum(bbox_a_arr[:, 2:], bbox_b_arr[:, 2:])
+        ], axis=1)
+        bbox_inter_area_arr = \
+            numpy.maximum(bbox_inter_arr[:, 2] - bbox_inter_arr[:, 0], 0) *\
+            numpy.maximum(bbox_inter_arr[:, 3] - bbox_inter_arr[:, 1], 0)
+
+        area_a_arr = area_arr[cand_idx_a_arr]
+        area_b_arr = area_arr[cand_idx_b_arr]
+
+        max_inter_arr = numpy.minimum(
+            numpy.minimum(area_a_arr, area_b_arr),
+            bbox_inter_area_arr
+        )
+        max_iou_arr = max_inter_arr / numpy.maximum(area_a_arr + area_b_arr - max_inter_arr, 1)
+
+        cand_sel_arr = max_iou_arr >= iou_thresh
+        cand_idx_a_arr = cand_idx_a_arr[cand_sel_arr]
+        cand_idx_b_arr = cand_idx_b_arr[cand_sel_arr]
+
+        # Exact RLE IoU of remaining candidates
+
+        iou_arr = numpy.asarray([
+            goripy.mask.rle.rle_iou(self._rle_list[idx_a], self._rle_list[idx_b])
+            for idx_a, idx_b in zip(cand_idx_a_arr, cand_idx_b_arr)
+        ], dtype=numpy.float64)
+
+        pair_arr = numpy.stack([
+            numpy.minimum(cand_idx_a_arr, cand_idx_b_arr),
+            numpy.maximum(cand_idx_a_arr, cand_idx_b_arr)
+        ], axis=1)
+
+        pair_sel_arr = iou_arr >= iou_thresh
+        pair_arr = pair_arr[pair_sel_arr]
+        iou_arr = iou_arr[pair_sel_arr]
+
+        sort_idxs = numpy.lexsort((pair_arr[:, 1], pair_arr[:, 0]))
+
+        return pair_arr[sort_idxs], iou_arr[sort_idxs]
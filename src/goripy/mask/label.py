@@ -0,0 +1,353 @@
+import numpy
+
+import goripy.mask.rle
+
+
+
+########
+
+
+
+def masks_to_label_map(
+    masks,
+    label_dtype=numpy.uint16
+):
+    """
+    Converts a stack of binary masks into a compact instance label map.
+
+    Mask `i` is assigned label `i + 1`, and background pixels are assigned label 0. Pixels
+    covered by more than one mask get the label of the last mask, and the hidden labels are
+    kept in an overlap side-list.
+
+    Args:
+
+        masks (numpy.ndarray):
+            3D boolean numpy array (N x H x W).
+
+        label_dtype (numpy.dtype, optional):
+            Label map dtype.
+            Defaults to `numpy.uint16`.
+
+    Returns:
+
+        tuple:
+            A 3-tuple consisting of:
+
+              - `label_map`: 2D numpy array (H x W) with the instance label of each pixel.
+              - `overlap_pix_idx_arr`: 1D numpy array with the row-major flat index of each
+                hidden (pixel, label) pair.
+              - `overlap_label_arr`: 1D numpy array with the label of each hidden
+                (pixel, label) pair.
+    """
+
+    num_masks = masks.shape[0]
+    _check_num_labels(num_masks, label_dtype)
+
+    if num_masks == 0:
+        return (
+            numpy.zeros(shape=masks.shape[1:], dtype=label_dtype),
+            numpy.zeros(shape=(0), dtype=numpy.int64),
+            numpy.zeros(shape=(0), dtype=label_dtype)
+        )
+
+    # Last mask covering each pixel
+
+    is_fg_map = numpy.any(masks, axis=0)
+    top_label_map = num_masks - numpy.argmax(masks[::-1], axis=0)
+
+    label_map = numpy.where(is_fg_map, top_label_map, 0).astype(label_dtype)
+
+    # Hidden labels of overlapping pixels
+
+    ovl_pix_idx_arr = numpy.flatnonzero(numpy.sum(masks, axis=0) > 1)
+    ovl_masks = masks.reshape(num_masks, -1)[:, ovl_pix_idx_arr]
+    ovl_top_mask_idx_arr = top_label_map.ravel()[ovl_pix_idx_arr] - 1
+    ovl_masks[ovl_top_mask_idx_arr, numpy.arange(ovl_pix_idx_arr.shape[0])] = False
+
+    ovl_mask_idx_arr, ovl_pos_arr = numpy.nonzero(ovl_masks)
+
+    overlap_pix_idx_arr = ovl_pix_idx_arr[ovl_pos_arr]
+    overlap_label_arr = (ovl_mask_idx_arr + 1).astype(label_dtype)
+
+    return label_map, overlap_pix_idx_arr, overlap_label_arr
+
+
+
+def rles_to_label_map(
+    rle_list,
+    shape,
+    label_dtype=numpy.uint16
+):
+    """
+    Converts a list of RLE encoded masks (see `goripy.mask.rle`) into a compact instance label
+    map, without decoding them into a stack of masks.
+
+    See `masks_to_label_map` for details on labels and overlaps.
+
+    Args:
+
+        rle_list (list of numpy.ndarray):
+            The encoded RLE of each mask, as arrays.
+            Dtype: uint32.
+
+        shape (2-tuple of int):
+            The dimensions of the masks (H x W).
+
+        label_dtype (numpy.dtype, optional):
+            Label map dtype.
+            Defaults to `numpy.uint16`.
+
+    Returns:
+
+        tuple:
+            A 3-tuple consisting of:
+
+              - `label_map`: 2D numpy array (H x W) with the instance label of each pixel.
+              - `overlap_pix_idx_arr`: 1D numpy array with the row-major flat index of each
+                hidden (pixel, label) pair.
+              - `overlap_label_arr`: 1D numpy array with the label of each hidden
+                (pixel, label) pair.
+    """
+
+    mask_h, mask_w = int(shape[0]), int(shape[1])
+    _check_num_labels(len(rle_list), label_dtype)
+
+    # Expand the runs of all masks into (pixel, label) pairs
+
+    run_arr_tuple_list = [goripy.mask.rle.rle_to_runs(rle) for rle in rle_list]
+
+    run_start_arr = numpy.concatenate(
+        [numpy.zeros(shape=(0), dtype=numpy.int64)] +
+        [run_arr_tuple[0] for run_arr_tuple in run_arr_tuple_list]
+    )
+    run_len_arr = numpy.concatenate(
+        [numpy.zeros(shape=(0), dtype=numpy.int64)] +
+        [run_arr_tuple[1] - run_arr_tuple[0] for run_arr_tuple in run_arr_tuple_list]
+    )
+    run_label_arr = numpy.repeat(
+        numpy.arange(1, len(rle_list) + 1),
+        [run_arr_tuple[0].shape[0] for run_arr_tuple in run_arr_tuple_list]
+    )
+
+    pix_label_arr = numpy.repeat(run_label_arr, run_len_arr)
+    pix_pos_arr = \
+        numpy.repeat(run_start_arr, run_len_arr) +\
+        numpy.arange(pix_label_arr.shape[0]) -\
+        numpy.repeat(numpy.cumsum(run_len_arr) - run_len_arr, run_len_arr)
+
+    # Column-major to row-major flat indices
+
+    pix_idx_arr = (pix_pos_arr % mask_h) * mask_w + pix_pos_arr // mask_h
+
+    # Sort pairs by pixel and label, and keep the last label of each pixel
+
+    sort_idxs = numpy.lexsort((pix_label_arr, pix_idx_arr))
+    pix_idx_arr = pix_idx_arr[sort_idxs]
+    pix_label_arr = pix_label_arr[sort_idxs]
+
+    is_top_arr = numpy.concatenate([pix_idx_arr[1:] != pix_idx_arr[:-1], [True]])\
+        if pix_idx_arr.shape[0] > 0 else numpy.zeros(shape=(0), dtype=bool)
+
+    label_map = numpy.zeros(shape=(mask_h * mask_w), dtype=label_dtype)
+    label_map[pix_idx_arr[is_top_arr]] = pix_label_arr[is_top_arr]
+    label_map = label_map.reshape(mask_h, mask_w)
+
+    overlap_pix_idx_arr = pix_idx_arr[~is_top_arr]
+    overlap_label_arr = pix_label_arr[~is_top_arr].astype(label_dtype)
+
+    return label_map, overlap_pix_idx_arr, overlap_label_arr
+
+
+
+########
+
+
+
+def label_map_to_masks(
+    label_map,
+    num_instances=None,
+    overlap_pix_idx_arr=None,
+    overlap_label_arr=None
+):
+    """
+    Converts a compact instance label map into a stack of binary masks.
+    Inverse of `masks_to_label_map`.
+
+    Args:
+
+        label_map (numpy.ndarray):
+            2D integer numpy array (H x W) with the instance label of each pixel.
+
+        num_instances (int, optional):
+            Number of instances N. If not provided, the maximum label is used.
+
+        overlap_pix_idx_arr (numpy.ndarray, optional):
+            1D numpy array with the row-major flat index of each hidden (pixel, label) pair.
+
+        overlap_label_arr (numpy.ndarray, optional):
+            1D numpy array with the label of each hidden (pixel, label) pair.
+
+    Returns:
+
+        numpy.ndarray:
+            3D boolean numpy array (N x H x W).
+    """
+
+    if num_instances is None:
+        num_instances = _get_max_label(label_map, overlap_label_arr)
+
+    masks = label_map[None, :, :] == numpy.arange(1, num_instances + 1)[:, None, None]
+
+    if overlap_pix_idx_arr is not None:
+        ovl_mask_idx_arr = overlap_label_arr.astype(numpy.int64) - 1
+        masks.reshape(num_instances, label_map.size)[ovl_mask_idx_arr, overlap_pix_idx_arr] = True
+
+    return masks
+
+
+
+def label_map_to_instances(
+    label_map,
+    num_instances=None,
+    overlap_pix_idx_arr=None,
+    overlap_label_arr=None
+):
+    """
+    Extracts the RLE encoding (see `goripy.mask.rle`), bbox limits and area of all instances
+    in a compact instance label map, in a single pass over the label map.
+    Instances without pixels yield an all-background RLE ([H*W]), (0, 0, 0, 0) bbox limits and
+    area 0. RLEs cover the full label map, so unlike the 0 x 0 crop of `mask_to_crop_rle` they
+    are never empty; use the area to detect absent instances.
+
+    Args:
+
+        label_map (numpy.ndarray):
+            2D integer numpy array (H x W) with the instance label of each pixel.
+
+        num_instances (int, optional):
+            Number of instances N. If not provided, the maximum label is used.
+
+        overlap_pix_idx_arr (numpy.ndarray, optional):
+            1D numpy array with the row-major flat index of each hidden (pixel, label) pair.
+
+        overlap_label_arr (numpy.ndarray, optional):
+            1D numpy array with the label of each hidden (pixel, label) pair.
+
+    Returns:
+
+        tuple:
+            A 3-tuple consisting of:
+
+              - `rle_list`: List with the encoded RLE of each instance. Dtype: uint32.
+              - `bbox_arr`: 2D numpy array (N x 4) with each instance bbox limits
+                (x0, y0, x1, y1).
+              - `area_arr`: 1D numpy array (N) with each instance area.
+    """
+
+    mask_h, mask_w = label_map.shape
+
+    if num_instances is None:
+        num_instances = _get_max_label(label_map, overlap_label_arr)
+
+    # Gather (pixel, label) pairs in column-major order
+
+    label_map_flat = label_map.ravel(order="F")
+
+    pix_pos_arr = numpy.flatnonzero(label_map_flat)
+    pix_label_arr = label_map_flat[pix_pos_arr].astype(numpy.int64)
+
+    if overlap_pix_idx_arr is not None:
+
+        ovl_row_arr, ovl_col_arr = numpy.divmod(overlap_pix_idx_arr, mask_w)
+
+        pix_pos_arr = numpy.concatenate([pix_pos_arr, ovl_col_arr * mask_h + ovl_row_arr])
+        pix_label_arr = numpy.concatenate([pix_label_arr, overlap_label_arr.astype(numpy.int64)])
+
+    sort_idxs = numpy.lexsort((pix_pos_arr, pix_label_arr))
+    pix_pos_arr = pix_pos_arr[sort_idxs]
+    pix_label_arr = pix_label_arr[sort_idxs]
+
+    valid_pix_arr = pix_label_arr <= num_instances
+    pix_pos_arr = pix_pos_arr[valid_pix_arr]
+    pix_label_arr = pix_label_arr[valid_pix_arr]
+
+    # Per-instance limits in the sorted pairs
+
+    label_lim_arr = numpy.searchsorted(pix_label_arr, numpy.arange(1, num_instances + 2))
+    label_start_arr = label_lim_arr[:-1]
+    label_end_arr = label_lim_arr[1:]
+
+    area_arr = label_end_arr - label_start_arr
+    has_pix_arr = area_arr > 0
+
+    # Bbox limits
+
+    pix_col_arr, pix_row_arr = numpy.divmod(pix_pos_arr, mask_h)
+    nonempty_start_arr = label_start_arr[has_pix_arr]
+
+    bbox_arr = numpy.zeros(shape=(num_instances, 4), dtype=numpy.int64)
+
+    if nonempty_start_arr.shape[0] > 0:
+        bbox_arr[has_pix_arr, 0] = pix_col_arr[nonempty_start_arr]
+        bbox_arr[has_pix_arr, 1] = numpy.minimum.reduceat(pix_row_arr, nonempty_start_arr)
+        bbox_arr[has_pix_arr, 2] = pix_col_arr[label_end_arr[has_pix_arr] - 1] + 1
+        bbox_arr[has_pix_arr, 3] = numpy.maximum.reduceat(pix_row_arr, nonempty_start_arr) + 1
+
+    # RLE encodings: runs break where positions are not consecutive or labels change
+
+    is_run_start_arr = numpy.ones(shape=pix_pos_arr.shape, dtype=bool)
+    is_run_start_arr[1:] = \
+        (pix_pos_arr[1:] != pix_pos_arr[:-1] + 1) |\
+        (pix_label_arr[1:] != pix_label_arr[:-1])
+
+    run_start_idxs = numpy.flatnonzero(is_run_start_arr)
+
+    run_start_arr = pix_pos_arr[run_start_idxs]
+    run_end_arr = numpy.concatenate([
+        pix_pos_arr[run_start_idxs[1:] - 1],
+        pix_pos_arr[-1:]
+    ]) + 1
+
+    run_lim_arr = numpy.searchsorted(run_start_idxs, label_lim_arr)
+
+    rle_list = [
+        goripy.mask.rle.runs_to_rle(
+            run_start_arr[run_lim_arr[label_idx]:run_lim_arr[label_idx + 1]],
+            run_end_arr[run_lim_arr[label_idx]:run_lim_arr[label_idx + 1]],
+            mask_h * mask_w
+        )
+        for label_idx in range(num_instances)
+    ]
+
+    return rle_list, bbox_arr, area_arr
+
+
+
+########
+
+
+
+def _check_num_labels(
+    num_labels,
+    label_dtype
+):
+
+    if num_labels > numpy.iinfo(label_dtype).max:
+        raise ValueError("Cannot store {:d} labels with dtype \"{:s}\"".format(
+            num_labels,
+            str(numpy.dtype(label_dtype))
+        ))
+
+
+
+def _get_max_label(
+    label_map,
+    overlap_label_arr
+):
+
+    max_label = int(numpy.max(label_map, initial=0))
+
+    if overlap_label_arr is not None:
+        max_label = max(max_label, int(numpy.max(overlap_label_arr, initial=0)))
+
+    return max_label
@@ -0,0 +1,212 @@
+import numpy
+
+
+
+########
+
+
+
+def rle_moments(
+    rle,
+    shape
+):
+    """
+    Computes area, centroid, second order central moments and orientation of an RLE encoded
+    mask (see `goripy.mask.rle`), without decoding it.
+
+    Statistics are computed analytically from the mask foreground runs, split into per-column
+    segments. Pixel coordinates refer to pixel centers, as in `cv2.moments`.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+        shape (2-tuple of int):
+            The original dimensions of the mask (H x W).
+
+    Returns:
+
+        dict:
+            Dictionary with the following keys:
+
+              - "area" (int): Number of foreground pixels.
+              - "centroid" (2-tuple of float): Centroid (x, y) coordinates.
+              - "mu20" (float): Second order central moment along the x axis.
+              - "mu02" (float): Second order central moment along the y axis.
+              - "mu11" (float): Second order central cross moment.
+              - "orientation" (float): Major axis angle in radians with respect to the x axis,
+                in the (-pi/2, pi/2] range. Positive angles point towards positive y.
+
+            Centroid, moments and orientation are NaN for empty masks.
+    """
+
+    moment_dict = batch_rle_moments([rle], shape)
+
+    return {
+        "area": moment_dict["area"][0].item(),
+        "centroid": tuple(moment_dict["centroid"][0].tolist()),
+        "mu20": moment_dict["mu20"][0].item(),
+        "mu02": moment_dict["mu02"][0].item(),
+        "mu11": moment_dict["mu11"][0].item(),
+        "orientation": moment_dict["orientation"][0].item()
+    }
+
+
+
+def batch_rle_moments(
+    rle_list,
+    shape
+):
+    """
+    Computes area, centroid, second order central moments and orientation of multiple RLE
+    encoded masks (see `goripy.mask.rle`), without decoding them.
+
+    All masks are processed at once, by concatenating their runs and accumulating per-segment
+    contributions for each mask.
+
+    Args:
+
+        rle_list (list of numpy.ndarray):
+            The encoded RLEs as arrays.
+            Dtype: uint32.
+
+        shape (2-tuple of int or numpy.ndarray):
+            The original dimensions of the masks (H x W). Either a single shape shared by all
+            masks, or a 2D numpy array (N x 2) with the shape of each mask.
+
+    Returns:
+
+        dict:
+            Dictionary with the following keys:
+
+              - "area": 1D numpy array (N) with the number of foreground pixels.
+              - "centroid": 2D numpy array (N x 2) with the centroid (x, y) coordinates.
+              - "mu20": 1D numpy array (N) with the second order central moments along the x
+                axis.
+              - "mu02": 1D numpy array (N) with the second order central moments along the y
+                axis.
+              - "mu11": 1D numpy array (N) with the second order central cross moments.
+              - "orientation": 1D numpy array (N) with the major axis angles in radians.
+
+            See `rle_moments` for details.
+    """
+
+    num_masks = len(rle_list)
+
+    shape_arr = numpy.asarray(shape, dtype=numpy.int64)
+    mask_h_arr = numpy.broadcast_to(shape_arr.reshape(-1, 2)[:, 0], (num_masks))
+
+    seg_mask_idx_arr, seg_col_arr, seg_row0_arr, seg_row1_arr =\
+        _batch_rle_to_col_segments(rle_list, mask_h_arr)
+
+    # Raw moments accumulated per segment
+
+    seg_x_arr = seg_col_arr.astype(numpy.float64)
+    seg_row0_arr = seg_row0_arr.astype(numpy.float64)
+    seg_row1_arr = seg_row1_arr.astype(numpy.float64)
+
+    seg_m00_arr = seg_row1_arr - seg_row0_arr
+    seg_sum_y_arr = seg_m00_arr * (seg_row0_arr + seg_row1_arr - 1) / 2
+    seg_sum_y2_arr = _sum_squares_below(seg_row1_arr) - _sum_squares_below(seg_row0_arr)
+
+    m00_arr = numpy.bincount(seg_mask_idx_arr, seg_m00_arr, minlength=num_masks)
+    m10_arr = numpy.bincount(seg_mask_idx_arr, seg_x_arr * seg_m00_arr, minlength=num_masks)
+    m01_arr = numpy.bincount(seg_mask_idx_arr, seg_sum_y_arr, minlength=num_masks)
+    m20_arr = numpy.bincount(seg_mask_idx_arr, seg_x_arr ** 2 * seg_m00_arr, minlength=num_masks)
+    m02_arr = numpy.bincount(seg_mask_idx_arr, seg_sum_y2_arr, minlength=num_masks)
+    m11_arr = numpy.bincount(seg_mask_idx_arr, seg_x_arr * seg_sum_y_arr, minlength=num_masks)
+
+    # Central moments
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+
+        cx_arr = m10_arr / m00_arr
+        cy_arr = m01_arr / m00_arr
+
+        mu20_arr = m20_arr - cx_arr * m10_arr
+        mu02_arr = m02_arr - cy_arr * m01_arr
+        mu11_arr = m11_arr - cx_arr * m01_arr
+
+    orientation_arr = 0.5 * numpy.arctan2(2 * mu11_arr, mu20_arr - mu02_arr)
+
+    return {
+        "area": m00_arr.astype(numpy.int64),
+        "centroid": numpy.stack([cx_arr, cy_arr], axis=1),
+        "mu20": mu20_arr,
+        "mu02": mu02_arr,
+        "mu11": mu11_arr,
+        "orientation": orientation_arr
+    }
+
+
+
+########
+
+
+
+def _batch_rle_to_col_segments(
+    rle_list,
+    mask_h_arr
+):
+
+    num_masks = len(rle_list)
+
+    rle_len_arr = numpy.fromiter(
+        (rle.shape[0] for rle in rle_list),
+        dtype=numpy.int64,
+        count=num_masks
+    )
+    rle_cat_arr = numpy.concatenate(
+        [numpy.zeros(shape=(0), dtype=numpy.int64)] + [rle.astype(numpy.int64) for rle in rle_list]
+    )
+
+    # Flat run positions, restarting at each mask
+
+    rle_offset_arr = numpy.cumsum(rle_len_arr) - rle_len_arr
+    run_mask_idx_arr = numpy.repeat(numpy.arange(num_masks), rle_len_arr)
+    run_local_idx_arr = numpy.arange(rle_cat_arr.shape[0]) - rle_offset_arr[run_mask_idx_arr]
+
+    mask_size_arr = numpy.bincount(run_mask_idx_arr, rle_cat_arr, minlength=num_masks)
+    mask_size_arr = mask_size_arr.astype(numpy.int64)
+    mask_base_arr = numpy.cumsum(mask_size_arr) - mask_size_arr
+    run_base_arr = mask_base_arr[run_mask_idx_arr]
+
+    run_end_arr = numpy.cumsum(rle_cat_arr)
+    run_start_arr = run_end_arr - rle_cat_arr
+
+    run_sel_arr = (run_local_idx_arr % 2 == 1) & (rle_cat_arr > 0)
+
+    run_mask_idx_arr = run_mask_idx_arr[run_sel_arr]
+    run_start_arr = (run_start_arr - run_base_arr)[run_sel_arr]
+    run_end_arr = (run_end_arr - run_base_arr)[run_sel_arr]
+
+    # Split runs into per-column segments
+
+    run_mask_h_arr = numpy.asarray(mask_h_arr, dtype=numpy.int64)[run_mask_idx_arr]
+
+    run_col0_arr = run_start_arr // run_mask_h_arr
+    run_num_cols_arr = (run_end_arr - 1) // run_mask_h_arr - run_col0_arr + 1
+
+    seg_run_idx_arr = numpy.repeat(numpy.arange(run_start_arr.shape[0]), run_num_cols_arr)
+    seg_run_pos_arr = numpy.arange(seg_run_idx_arr.shape[0]) -\
+        numpy.repeat(numpy.cumsum(run_num_cols_arr) - run_num_cols_arr, run_num_cols_arr)
+
+    seg_mask_h_arr = run_mask_h_arr[seg_run_idx_arr]
+    seg_col_arr = run_col0_arr[seg_run_idx_arr] + seg_run_pos_arr
+    seg_row0_arr = numpy.maximum(run_start_arr[seg_run_idx_arr] - seg_col_arr * seg_mask_h_arr, 0)
+    seg_row1_arr = numpy.minimum(
+        run_end_arr[seg_run_idx_arr] - seg_col_arr * seg_mask_h_arr,
+        seg_mask_h_arr
+    )
+
+    return run_mask_idx_arr[seg_run_idx_arr], seg_col_arr, seg_row0_arr, seg_row1_arr
+
+
+
+def _sum_squares_below(
+    val_arr
+):
+
+    return (val_arr - 1) * val_arr * (2 * val_arr - 1) / 6
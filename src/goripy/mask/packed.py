@@ -0,0 +1,395 @@
+import numpy
+
+import goripy.mask.bbox
+import goripy.mask.rle
+
+
+
+########
+
+
+
+_POPCOUNT_LUT = numpy.asarray(
+    [bin(byte_val).count("1") for byte_val in range(256)],
+    dtype=numpy.uint8
+)
+
+
+
+########
+
+
+
+class BitPackedMask:
+    """
+    Stores binary masks packed into bits (8 pixels per byte).
+    Can hold either a single mask (H x W) or a stack of masks (N x H x W).
+
+    Each mask row is packed separately along the W axis with `numpy.packbits`, so rows are
+    byte-aligned and logical operations work directly on whole bytes.
+    Padding bits at the end of each row are always zero.
+
+    Args:
+
+        packed_arr (numpy.ndarray):
+            Packed mask bytes.
+            Shape: (H x ceil(W / 8)) or (N x H x ceil(W / 8)). Dtype: `numpy.uint8`.
+
+        shape (tuple of int):
+            Shape of the unpacked mask(s), (H x W) or (N x H x W).
+    """
+
+
+    def __init__(
+        self,
+        packed_arr,
+        shape
+    ):
+
+        shape = tuple(int(dim_size) for dim_size in shape)
+
+        if len(shape) not in (2, 3):
+            raise ValueError("Invalid mask shape {:s}. Expected (H x W) or (N x H x W)".format(
+                str(shape)
+            ))
+
+        exp_packed_shape = shape[:-1] + ((shape[-1] + 7) // 8,)
+        if packed_arr.shape != exp_packed_shape:
+            raise ValueError("Packed array shape {:s} does not match mask shape {:s}".format(
+                str(packed_arr.shape),
+                str(shape)
+            ))
+
+        self._packed_arr = packed_arr
+        self._shape = shape
+
+
+    @property
+    def shape(
+        self
+    ):
+        """
+        tuple of int: Shape of the unpacked mask(s).
+        """
+
+        return self._shape
+
+
+    @property
+    def packed_arr(
+        self
+    ):
+        """
+        numpy.ndarray: The underlying packed bytes.
+        """
+
+        return self._packed_arr
+
+
+    def is_stack(
+        self
+    ):
+        """
+        Checks whether this object holds a stack of masks.
+
+        Returns:
+
+            bool:
+                True if this object holds (N x H x W) masks, False if it holds a (H x W) mask.
+        """
+
+        return len(self._shape) == 3
+
+
+    def __len__(
+        self
+    ):
+
+        if not self.is_stack():
+            raise TypeError("Single {:s} objects have no length".format(type(self).__name__))
+
+        return self._shape[0]
+
+
+    def __getitem__(
+        self,
+        idx
+    ):
+
+        if not self.is_stack():
+            raise TypeError("Single {:s} objects are not indexable".format(type(self).__name__))
+
+        sub_packed_arr = self._packed_arr[idx]
+
+        return BitPackedMask(sub_packed_arr, sub_packed_arr.shape[:-1] + self._shape[-1:])
+
+
+    @classmethod
+    def from_mask(
+        cls,
+        mask
+    ):
+        """
+        Creates a BitPackedMask from a dense boolean mask or stack of masks.
+
+        Args:
+
+            mask (numpy.ndarray):
+                Boolean mask(s) to pack.
+                Shape: (H x W) or (N x H x W). Dtype: `bool`.
+
+        Returns:
+
+            BitPackedMask:
+                The created packed mask object.
+        """
+
+        return cls(numpy.packbits(mask, axis=-1), mask.shape)
+
+
+    @classmethod
+    def from_rle(
+        cls,
+        rle,
+        shape
+    ):
+        """
+        Creates a BitPackedMask from an RLE encoded mask (see `goripy.mask.rle`).
+
+        Args:
+
+            rle (numpy.ndarray):
+                The encoded RLE as an array.
+                Dtype: uint32.
+
+            shape (2-tuple of int):
+                The original dimensions of the mask (H x W).
+
+        Returns:
+
+            BitPackedMask:
+                The created packed mask object.
+        """
+
+        return cls.from_mask(goripy.mask.rle.rle_to_mask(rle, shape))
+
+
+    @classmethod
+    def stack(
+        cls,
+        packed_mask_list
+    ):
+        """
+        Stacks multiple single BitPackedMask objects with the same shape.
+
+        Args:
+
+            packed_mask_list (list of BitPackedMask):
+                Single packed masks to stack.
+
+        Returns:
+
+            BitPackedMask:
+                The stacked packed mask object.
+        """
+
+        if len(packed_mask_list) == 0:
+            raise ValueError("Cannot stack an empty list of packed masks")
+
+        shape = packed_mask_list[0].shape
+        for packed_mask in packed_mask_list:
+            if packed_mask.shape != shape or len(shape) != 2:
+                raise ValueError("All packed masks must be single masks with the same shape")
+
+        packed_arr = numpy.stack([packed_mask.packed_arr for packed_mask in packed_mask_list])
+
+        return cls(packed_arr, (len(packed_mask_list),) + shape)
+
+
+    def to_mask(
+        self
+    ):
+        """
+        Unpacks this object into a dense boolean mask or stack of masks.
+
+        Returns:
+
+            numpy.ndarray:
+                The unpacked mask(s).
+                Shape: (H x W) or (N x H x W). Dtype: `bool`.
+        """
+
+        return numpy.unpackbits(
+            self._packed_arr,
+            axis=-1,
+            count=self._shape[-1]
+        ).view(bool)
+
+
+    def to_rle(
+        self
+    ):
+        """
+        Encodes this object into RLE (see `goripy.mask.rle`).
+
+        Returns:
+
+            numpy.ndarray or list of numpy.ndarray:
+                The encoded RLE, or a list with one RLE per mask if this object holds a stack.
+                Dtype: uint32.
+        """
+
+        if self.is_stack():
+            return [goripy.mask.rle.mask_to_rle(mask) for mask in self.to_mask()]
+
+        return goripy.mask.rle.mask_to_rle(self.to_mask())
+
+
+    def area(
+        self
+    ):
+        """
+        Computes the number of foreground pixels.
+
+        Returns:
+
+            int or numpy.ndarray:
+                The mask area, or a 1D array with each mask area if this object holds a stack.
+        """
+
+        return _packed_popcount(self._packed_arr)
+
+
+    def bbox(
+        self
+    ):
+        """
+        Computes bbox limits. Empty masks yield (0, 0, 0, 0) limits.
+
+        Returns:
+
+            tuple of int or numpy.ndarray:
+                The bbox limits (x0, y0, x1, y1), or a 2D array (N x 4) with each mask bbox
+                limits if this object holds a stack.
+        """
+
+        row_any_arr = numpy.any(self._packed_arr, axis=-1)
+        col_any_arr = numpy.unpackbits(
+            numpy.bitwise_or.reduce(self._packed_arr, axis=-2),
+            axis=-1,
+            count=self._shape[-1]
+        ).view(bool)
+
+        x0, x1 = goripy.mask.bbox.proj_to_limits(col_any_arr)
+        y0, y1 = goripy.mask.bbox.proj_to_limits(row_any_arr)
+
+        if self.is_stack():
+            return numpy.stack([x0, y0, x1, y1], axis=1)
+
+        return x0.item(), y0.item(), x1.item(), y1.item()
+
+
+    def _check_other(
+        self,
+        other
+    ):
+
+        if not isinstance(other, BitPackedMask):
+            return False
+
+        if other.shape != self._shape:
+            raise ValueError("Packed mask shapes do not match: {:s} and {:s}".format(
+                str(self._shape),
+                str(other.shape)
+            ))
+
+        return True
+
+
+    def __and__(
+        self,
+        other
+    ):
+
+        if not self._check_other(other): return NotImplemented
+        return BitPackedMask(numpy.bitwise_and(self._packed_arr, other.packed_arr), self._shape)
+
+
+    def __or__(
+        self,
+        other
+    ):
+
+        if not self._check_other(other): return NotImplemented
+        return BitPackedMask(numpy.bitwise_or(self._packed_arr, other.packed_arr), self._shape)
+
+
+    def __xor__(
+        self,
+        other
+    ):
+
+        if not self._check_other(other): return NotImplemented
+        return BitPackedMask(numpy.bitwise_xor(self._packed_arr, other.packed_arr), self._shape)
+
+
+    def iou(
+        self,
+        other
+    ):
+        """
+        Computes the Intersection over Union with another packed mask of the same shape.
+        IoU between two empty masks is 0. Raises a TypeError if the other object is not a
+        BitPackedMask, and a ValueError if shapes do not match.
+
+        Args:
+
+            other (BitPackedMask):
+                The other packed mask(s).
+
+        Returns:
+
+            float or numpy.ndarray:
+                The IoU value, or a 1D array with each mask pair IoU if both objects hold a
+                stack.
+        """
+
+        if not self._check_other(other):
+            raise TypeError("Expected a BitPackedMask, got {:s}".format(str(type(other))))
+
+        inter = _packed_popcount(numpy.bitwise_and(self._packed_arr, other.packed_arr))
+        union = _packed_popcount(numpy.bitwise_or(self._packed_arr, other.packed_arr))
+
+        iou = inter / numpy.maximum(union, 1)
+
+        return iou if self.is_stack() else float(iou)
+
+
+    def get_num_bytes(
+        self
+    ):
+        """
+        Computes the RAM memory overhead of this object.
+
+        Returns:
+
+            int:
+                Number of bytes occupied by this object.
+        """
+
+        return self._packed_arr.nbytes
+
+
+
+########
+
+
+
+def _packed_popcount(
+    packed_arr
+):
+
+    num_set_bits = numpy.sum(_POPCOUNT_LUT[packed_arr], axis=(-2, -1), dtype=numpy.int64)
+
+    return num_set_bits if packed_arr.ndim == 3 else num_set_bits.item()
+
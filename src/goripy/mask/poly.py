@@ -0,0 +1,487 @@
+import math
+
+import numpy
+
+import goripy.mask.rle
+
+
+
+########
+
+
+
+def polygons_to_rle(
+    polygon_list,
+    shape
+):
+    """
+    Rasterizes polygons into an RLE encoded mask (see `goripy.mask.rle`).
+
+    See `batch_polygons_to_rle` for details.
+
+    Args:
+
+        polygon_list (list of numpy.ndarray):
+            Polygons of the shape. Each polygon is a (K x 2) array with its (x, y) vertices, or
+            a flat sequence (x1, y1, x2, y2, ...) as found in COCO annotations.
+
+        shape (2-tuple of int):
+            The dimensions of the mask (H x W).
+
+    Returns:
+
+        numpy.ndarray:
+            The encoded RLE as an array.
+            Dtype: uint32.
+    """
+
+    return batch_polygons_to_rle([polygon_list], shape)[0]
+
+
+
+def batch_polygons_to_rle(
+    polygon_llist,
+    shape
+):
+    """
+    Rasterizes many shapes, each made of one or more polygons, into RLE encoded masks
+    (see `goripy.mask.rle`).
+
+    Rasterization is performed with vertical scanlines through pixel centers, for all polygons
+    of all shapes at once, so that column-major RLE runs are produced directly without
+    allocating dense masks. A pixel is foreground if its center lies inside the shape, following
+    the even-odd rule. Polygons of the same shape are combined with the even-odd rule too, so
+    hole polygons (e.g. produced by `rle_to_polygons`) are subtracted from outer polygons.
+
+    Args:
+
+        polygon_llist (list of list of numpy.ndarray):
+            Polygons of each shape. Each polygon is a (K x 2) array with its (x, y) vertices, or
+            a flat sequence (x1, y1, x2, y2, ...) as found in COCO annotations.
+
+        shape (2-tuple of int):
+            The dimensions of the masks (H x W).
+
+    Returns:
+
+        list of numpy.ndarray:
+            The encoded RLE of each shape, as arrays.
+            Dtype: uint32.
+    """
+
+    mask_h, mask_w = int(shape[0]), int(shape[1])
+
+    # Gather the edges of all polygons
+
+    edge_arrr_list = []
+    edge_shape_idx_arr_list = []
+
+    for shape_idx, polygon_list in enumerate(polygon_llist):
+        for polygon in polygon_list:
+
+            vert_arrr = numpy.asarray(polygon, dtype=numpy.float64).reshape(-1, 2)
+            if vert_arrr.shape[0] < 3:
+                continue
+
+            edge_arrr_list.append(numpy.concatenate([
+                vert_arrr,
+                numpy.roll(vert_arrr, -1, axis=0)
+            ], axis=1))
+            edge_shape_idx_arr_list.append(numpy.full(vert_arrr.shape[0], shape_idx))
+
+    rle_list = [
+        numpy.asarray([mask_h * mask_w], dtype=numpy.uint32)
+        for _ in range(len(polygon_llist))
+    ]
+
+    if len(edge_arrr_list) == 0:
+        return rle_list
+
+    edge_arrr = numpy.concatenate(edge_arrr_list)
+    edge_shape_idx_arr = numpy.concatenate(edge_shape_idx_arr_list)
+
+    xa_arr, ya_arr, xb_arr, yb_arr = edge_arrr.T
+
+    # Expand each edge into the columns whose center scanline it crosses
+    # Scanline x = c + 0.5 crosses an edge if it lies in [min(xa, xb), max(xa, xb))
+
+    col0_arr = numpy.clip(numpy.ceil(numpy.minimum(xa_arr, xb_arr) - 0.5), 0, mask_w)
+    col1_arr = numpy.clip(numpy.ceil(numpy.maximum(xa_arr, xb_arr) - 0.5), 0, mask_w)
+
+    col0_arr = col0_arr.astype(numpy.int64)
+    col1_arr = col1_arr.astype(numpy.int64)
+    num_cols_arr = col1_arr - col0_arr
+
+    cross_edge_idx_arr = numpy.repeat(numpy.arange(edge_arrr.shape[0]), num_cols_arr)
+    cross_col_arr = col0_arr[cross_edge_idx_arr] + numpy.arange(cross_edge_idx_arr.shape[0]) -\
+        numpy.repeat(numpy.cumsum(num_cols_arr) - num_cols_arr, num_cols_arr)
+
+    cross_xa_arr = xa_arr[cross_edge_idx_arr]
+    cross_ya_arr = ya_arr[cross_edge_idx_arr]
+    cross_y_arr = cross_ya_arr + (cross_col_arr + 0.5 - cross_xa_arr) *\
+        (yb_arr[cross_edge_idx_arr] - cross_ya_arr) / (xb_arr[cross_edge_idx_arr] - cross_xa_arr)
+    cross_shape_idx_arr = edge_shape_idx_arr[cross_edge_idx_arr]
+
+    # Sort crossings by shape, column and y, and pair them into inside intervals
+    # Every (shape, column) group has an even number of crossings
+
+    sort_idxs = numpy.lexsort((cross_y_arr, cross_col_arr, cross_shape_idx_arr))
+
+    cross_y_arr = cross_y_arr[sort_idxs]
+    cross_col_arr = cross_col_arr[sort_idxs]
+    cross_shape_idx_arr = cross_shape_idx_arr[sort_idxs]
+
+    seg_row0_arr = numpy.clip(numpy.ceil(cross_y_arr[0::2] - 0.5), 0, mask_h).astype(numpy.int64)
+    seg_row1_arr = numpy.clip(numpy.ceil(cross_y_arr[1::2] - 0.5), 0, mask_h).astype(numpy.int64)
+    seg_col_arr = cross_col_arr[0::2]
+    seg_shape_idx_arr = cross_shape_idx_arr[0::2]
+
+    # Encode each shape segments
+
+    shape_lim_arr = numpy.searchsorted(seg_shape_idx_arr, numpy.arange(len(polygon_llist) + 1))
+
+    for shape_idx in range(len(polygon_llist)):
+
+        seg_slice = slice(shape_lim_arr[shape_idx], shape_lim_arr[shape_idx + 1])
+
+        rle_list[shape_idx] = goripy.mask.rle.col_segments_to_rle(
+            seg_col_arr[seg_slice],
+            seg_row0_arr[seg_slice],
+            seg_row1_arr[seg_slice],
+            shape
+        )
+
+    return rle_list
+
+
+
+########
+
+
+
+def rle_to_polygons(
+    rle,
+    shape
+):
+    """
+    Extracts the boundary polygons of an RLE encoded mask (see `goripy.mask.rle`).
+
+    See `batch_rle_to_polygons` for details.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+        shape (2-tuple of int):
+            The dimensions of the mask (H x W).
+
+    Returns:
+
+        tuple:
+            A 2-tuple consisting of:
+
+              - `polygon_list`: List of (K x 2) arrays with each polygon (x, y) vertices.
+              - `is_hole_arr`: 1D boolean array indicating which polygons are holes.
+    """
+
+    return batch_rle_to_polygons([rle], shape)[0]
+
+
+
+def crop_rle_to_polygons(
+    crop_rle,
+    bbox
+):
+    """
+    Extracts the boundary polygons of a bbox-cropped RLE encoded mask
+    (see `goripy.mask.rle.mask_to_crop_rle`).
+    Cost is proportional to the crop, and polygon vertices are given in full mask coordinates.
+
+    See `batch_rle_to_polygons` for details.
+
+    Args:
+
+        crop_rle (numpy.ndarray):
+            The RLE of the cropped mask, as an array.
+            Dtype: uint32.
+
+        bbox (4-tuple of int):
+            The bbox limits (x0, y0, x1, y1) of the crop.
+
+    Returns:
+
+        tuple:
+            A 2-tuple consisting of:
+
+              - `polygon_list`: List of (K x 2) arrays with each polygon (x, y) vertices.
+              - `is_hole_arr`: 1D boolean array indicating which polygons are holes.
+    """
+
+    x0, y0, x1, y1 = bbox
+
+    polygon_list, is_hole_arr = rle_to_polygons(crop_rle, (y1 - y0, x1 - x0))
+    polygon_list = [polygon + numpy.asarray([x0, y0]) for polygon in polygon_list]
+
+    return polygon_list, is_hole_arr
+
+
+
+def batch_rle_to_polygons(
+    rle_list,
+    shape
+):
+    """
+    Extracts the boundary polygons of many RLE encoded masks (see `goripy.mask.rle`).
+
+    Boundaries are built from the per-column runs of all masks at once, without decoding them,
+    and traced along pixel edges. Polygon vertices lie on pixel corners, so rasterizing the
+    polygons with `batch_polygons_to_rle` recovers the original masks exactly.
+
+    Outer boundaries are traced clockwise (positive signed area in image coordinates) and hole
+    boundaries counter-clockwise. Pixels touching only diagonally yield separate polygons.
+
+    Args:
+
+        rle_list (list of numpy.ndarray):
+            The encoded RLE of each mask, as arrays.
+            Dtype: uint32.
+
+        shape (2-tuple of int):
+            The dimensions of the masks (H x W).
+
+    Returns:
+
+        list of tuple:
+            One 2-tuple per mask consisting of:
+
+              - `polygon_list`: List of (K x 2) arrays with each polygon (x, y) vertices.
+              - `is_hole_arr`: 1D boolean array indicating which polygons are holes.
+    """
+
+    mask_h, mask_w = int(shape[0]), int(shape[1])
+
+    # Gather per-column foreground segments of all masks
+
+    seg_arr_tuple_list = [goripy.mask.rle.rle_to_col_segments(rle, shape) for rle in rle_list]
+
+    seg_mask_idx_arr = numpy.repeat(
+        numpy.arange(len(rle_list)),
+        [seg_arr_tuple[0].shape[0] for seg_arr_tuple in seg_arr_tuple_list]
+    )
+    seg_col_arr, seg_row0_arr, seg_row1_arr = (
+        numpy.concatenate([numpy.zeros(shape=(0), dtype=numpy.int64)] + [
+            seg_arr_tuple[seg_arr_idx] for seg_arr_tuple in seg_arr_tuple_list
+        ])
+        for seg_arr_idx in range(3)
+    )
+
+    if seg_col_arr.shape[0] == 0:
+        return [([], numpy.zeros(shape=(0), dtype=bool)) for _ in range(len(rle_list))]
+
+    # Horizontal boundary edges: top and bottom of each segment
+
+    hor_edge_arr_list = _build_edge_arrs(
+        numpy.concatenate([seg_mask_idx_arr, seg_mask_idx_arr]),
+        numpy.concatenate([seg_col_arr, seg_col_arr + 1]),
+        numpy.concatenate([seg_row0_arr, seg_row1_arr]),
+        numpy.concatenate([seg_col_arr + 1, seg_col_arr]),
+        numpy.concatenate([seg_row0_arr, seg_row1_arr])
+    )
+
+    # Vertical boundary edges: where foreground differs between both sides of line x = c
+    # Each segment contributes to its left line (as right side) and its right line (as left side)
+
+    num_segs = seg_col_arr.shape[0]
+    zero_arr = numpy.zeros(shape=(num_segs), dtype=numpy.int64)
+    one_arr = numpy.ones(shape=(num_segs), dtype=numpy.int64)
+
+    evt_mask_idx_arr = numpy.tile(seg_mask_idx_arr, 4)
+    evt_line_arr = numpy.concatenate([seg_col_arr, seg_col_arr, seg_col_arr + 1, seg_col_arr + 1])
+    evt_y_arr = numpy.concatenate([seg_row0_arr, seg_row1_arr, seg_row0_arr, seg_row1_arr])
+    evt_dl_arr = numpy.concatenate([zero_arr, zero_arr, one_arr, -one_arr])
+    evt_dr_arr = numpy.concatenate([one_arr, -one_arr, zero_arr, zero_arr])
+
+    sort_idxs = numpy.lexsort((evt_y_arr, evt_line_arr, evt_mask_idx_arr))
+
+    evt_mask_idx_arr = evt_mask_idx_arr[sort_idxs]
+    evt_line_arr = evt_line_arr[sort_idxs]
+    evt_y_arr = evt_y_arr[sort_idxs]
+    evt_left_arr = numpy.cumsum(evt_dl_arr[sort_idxs])
+    evt_right_arr = numpy.cumsum(evt_dr_arr[sort_idxs])
+
+    is_edge_arr = \
+        (evt_mask_idx_arr[:-1] == evt_mask_idx_arr[1:]) &\
+        (evt_line_arr[:-1] == evt_line_arr[1:]) &\
+        (evt_y_arr[:-1] < evt_y_arr[1:]) &\
+        (evt_left_arr[:-1] != evt_right_arr[:-1])
+
+    edge_idxs = numpy.flatnonzero(is_edge_arr)
+    is_down_arr = evt_left_arr[edge_idxs] > 0
+
+    ver_edge_arr_list = _build_edge_arrs(
+        evt_mask_idx_arr[edge_idxs],
+        evt_line_arr[edge_idxs],
+        numpy.where(is_down_arr, evt_y_arr[edge_idxs], evt_y_arr[edge_idxs + 1]),
+        evt_line_arr[edge_idxs],
+        numpy.where(is_down_arr, evt_y_arr[edge_idxs + 1], evt_y_arr[edge_idxs])
+    )
+
+    # Link edges into closed boundaries
+
+    edge_mask_idx_arr, edge_xa_arr, edge_ya_arr, edge_xb_arr, edge_yb_arr = (
+        numpy.concatenate([hor_edge_arr, ver_edge_arr])
+        for hor_edge_arr, ver_edge_arr in zip(hor_edge_arr_list, ver_edge_arr_list)
+    )
+
+    vert_id_a_arr = (edge_mask_idx_arr * (mask_h + 1) + edge_ya_arr) * (mask_w + 1) + edge_xa_arr
+    vert_id_b_arr = (edge_mask_idx_arr * (mask_h + 1) + edge_yb_arr) * (mask_w + 1) + edge_xb_arr
+
+    edge_dx_arr = numpy.sign(edge_xb_arr - edge_xa_arr)
+    edge_dy_arr = numpy.sign(edge_yb_arr - edge_ya_arr)
+
+    next_edge_idx_arr = _link_edges(
+        vert_id_a_arr,
+        vert_id_b_arr,
+        edge_dx_arr,
+        edge_dy_arr
+    )
+
+    edge_order_idxs, edge_cycle_id_arr = _order_edge_cycles(next_edge_idx_arr)
+
+    cycle_area_arr = 0.5 * numpy.bincount(
+        edge_cycle_id_arr,
+        weights=edge_xa_arr * edge_yb_arr - edge_xb_arr * edge_ya_arr,
+        minlength=edge_cycle_id_arr.shape[0]
+    )
+
+    # Keep only boundary corners (vertices where the direction changes)
+
+    edge_mask_idx_arr = edge_mask_idx_arr[edge_order_idxs]
+    edge_xa_arr = edge_xa_arr[edge_order_idxs]
+    edge_ya_arr = edge_ya_arr[edge_order_idxs]
+    edge_dx_arr = edge_dx_arr[edge_order_idxs]
+    edge_dy_arr = edge_dy_arr[edge_order_idxs]
+    edge_cycle_id_arr = edge_cycle_id_arr[edge_order_idxs]
+
+    prev_edge_idx_arr = numpy.arange(edge_order_idxs.shape[0]) - 1
+    is_cycle_start_arr = numpy.concatenate([
+        [True],
+        edge_cycle_id_arr[1:] != edge_cycle_id_arr[:-1]
+    ])
+    cycle_start_idxs = numpy.flatnonzero(is_cycle_start_arr)
+    cycle_end_idxs = numpy.concatenate([cycle_start_idxs[1:], [edge_order_idxs.shape[0]]])
+    prev_edge_idx_arr[cycle_start_idxs] = cycle_end_idxs - 1
+
+    is_corner_arr = \
+        (edge_dx_arr != edge_dx_arr[prev_edge_idx_arr]) |\
+        (edge_dy_arr != edge_dy_arr[prev_edge_idx_arr])
+
+    corner_cycle_id_arr = edge_cycle_id_arr[is_corner_arr]
+    corner_mask_idx_arr = edge_mask_idx_arr[is_corner_arr]
+    corner_arrr = numpy.stack([edge_xa_arr[is_corner_arr], edge_ya_arr[is_corner_arr]], axis=1)
+
+    # Split corners into polygons and polygons into masks
+
+    poly_start_idxs = numpy.flatnonzero(numpy.concatenate([
+        [True],
+        corner_cycle_id_arr[1:] != corner_cycle_id_arr[:-1]
+    ]))
+
+    polygon_list = numpy.split(corner_arrr.astype(numpy.float64), poly_start_idxs[1:])
+    poly_mask_idx_arr = corner_mask_idx_arr[poly_start_idxs]
+    is_hole_arr = cycle_area_arr[corner_cycle_id_arr[poly_start_idxs]] < 0
+
+    mask_lim_arr = numpy.searchsorted(poly_mask_idx_arr, numpy.arange(len(rle_list) + 1))
+
+    return [
+        (
+            polygon_list[mask_lim_arr[mask_idx]:mask_lim_arr[mask_idx + 1]],
+            is_hole_arr[mask_lim_arr[mask_idx]:mask_lim_arr[mask_idx + 1]]
+        )
+        for mask_idx in range(len(rle_list))
+    ]
+
+
+
+def _build_edge_arrs(
+    mask_idx_arr,
+    xa_arr,
+    ya_arr,
+    xb_arr,
+    yb_arr
+):
+
+    return [
+        numpy.asarray(arr, dtype=numpy.int64)
+        for arr in (mask_idx_arr, xa_arr, ya_arr, xb_arr, yb_arr)
+    ]
+
+
+
+def _link_edges(
+    vert_id_a_arr,
+    vert_id_b_arr,
+    edge_dx_arr,
+    edge_dy_arr
+):
+
+    # Outgoing edges of each vertex, sorted by starting vertex
+    # Every vertex has either 1 or 2 outgoing edges
+
+    out_sort_idxs = numpy.argsort(vert_id_a_arr, kind="stable")
+    out_vert_id_arr = vert_id_a_arr[out_sort_idxs]
+
+    cand_pos_arr = numpy.searchsorted(out_vert_id_arr, vert_id_b_arr, side="left")
+    cand_edge_idx_arr = out_sort_idxs[cand_pos_arr]
+
+    # On vertices with 2 outgoing edges, turn right (in image coordinates)
+
+    alt_cand_pos_arr = numpy.minimum(cand_pos_arr + 1, out_vert_id_arr.shape[0] - 1)
+    alt_cand_edge_idx_arr = out_sort_idxs[alt_cand_pos_arr]
+
+    has_alt_arr = out_vert_id_arr[alt_cand_pos_arr] == vert_id_b_arr
+    has_alt_arr &= alt_cand_pos_arr != cand_pos_arr
+
+    is_alt_right_arr = \
+        (edge_dx_arr[alt_cand_edge_idx_arr] == -edge_dy_arr) &\
+        (edge_dy_arr[alt_cand_edge_idx_arr] == edge_dx_arr)
+
+    return numpy.where(has_alt_arr & is_alt_right_arr, alt_cand_edge_idx_arr, cand_edge_idx_arr)
+
+
+
+def _order_edge_cycles(
+    next_edge_idx_arr
+):
+
+    num_edges = next_edge_idx_arr.shape[0]
+    num_jumps = math.ceil(math.log2(max(num_edges, 2))) + 1
+
+    # Label each cycle with its minimum edge index via pointer jumping
+
+    cycle_id_arr = numpy.arange(num_edges)
+    jump_edge_idx_arr = next_edge_idx_arr.copy()
+
+    for _ in range(num_jumps):
+        cycle_id_arr = numpy.minimum(cycle_id_arr, cycle_id_arr[jump_edge_idx_arr])
+        jump_edge_idx_arr = jump_edge_idx_arr[jump_edge_idx_arr]
+
+    # Compute the distance from each edge to its cycle label edge via list ranking
+
+    is_root_arr = cycle_id_arr == numpy.arange(num_edges)
+
+    dist_arr = numpy.where(is_root_arr, 0, 1)
+    jump_edge_idx_arr = numpy.where(is_root_arr, numpy.arange(num_edges), next_edge_idx_arr)
+
+    for _ in range(num_jumps):
+        dist_arr = dist_arr + dist_arr[jump_edge_idx_arr]
+        jump_edge_idx_arr = jump_edge_idx_arr[jump_edge_idx_arr]
+
+    # Edges in cycle order: decreasing distance to the label edge, which goes last
+
+    edge_order_idxs = numpy.lexsort((-dist_arr, cycle_id_arr))
+
+    return edge_order_idxs, cycle_id_arr
+
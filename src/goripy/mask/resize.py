@@ -0,0 +1,107 @@
+import numpy
+
+import goripy.mask.rle
+
+
+
+def resize_rle(
+    rle,
+    shape,
+    new_shape,
+    mode="nearest",
+    threshold=0.5
+):
+    """
+    Resizes an RLE encoded mask (see `goripy.mask.rle`) directly in RLE space.
+    The full resolution mask is never decoded.
+
+    The following resizing modes are available:
+
+    - "nearest": Each resized pixel takes the value of the original pixel closest to its center.
+      Cost is proportional to the resized mask size.
+    - "majority": Each resized pixel is foreground if the fraction of foreground original pixels
+      in its area is greater than `threshold`. Only supports downsampling. Cost is proportional
+      to the original mask width times the resized mask height.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+        shape (2-tuple of int):
+            The original dimensions of the mask (H x W).
+
+        new_shape (2-tuple of int):
+            The resized dimensions of the mask (H' x W').
+
+        mode (str, optional):
+            Resizing mode. Either "nearest" or "majority".
+            Defaults to "nearest".
+
+        threshold (float, optional):
+            Foreground fraction threshold for the "majority" mode.
+            Defaults to 0.5.
+
+    Returns:
+
+        numpy.ndarray:
+            The encoded RLE of the resized mask, as an array.
+            Dtype: uint32.
+    """
+
+    mask_h, mask_w = int(shape[0]), int(shape[1])
+    new_mask_h, new_mask_w = int(new_shape[0]), int(new_shape[1])
+
+    if mode == "nearest":
+
+        row_arr = _nearest_src_idxs(mask_h, new_mask_h)
+        col_arr = _nearest_src_idxs(mask_w, new_mask_w)
+
+        pos_arrr = col_arr[:, None] * mask_h + row_arr[None, :]
+        new_mask_flat = goripy.mask.rle.rle_contains(rle, pos_arrr.ravel())
+
+    elif mode == "majority":
+
+        if new_mask_h > mask_h or new_mask_w > mask_w:
+            raise ValueError("Mode \"majority\" only supports downsampling: {:s} -> {:s}".format(
+                str(tuple(shape)),
+                str(tuple(new_shape))
+            ))
+
+        row_lim_arr = numpy.round(numpy.linspace(0, mask_h, new_mask_h + 1)).astype(numpy.int64)
+        col_lim_arr = numpy.round(numpy.linspace(0, mask_w, new_mask_w + 1)).astype(numpy.int64)
+
+        # Foreground count per original column and resized row
+
+        count_before_arrr = goripy.mask.rle.rle_count_before(
+            rle,
+            numpy.arange(mask_w)[:, None] * mask_h + row_lim_arr[None, :]
+        )
+        col_count_arrr = numpy.diff(count_before_arrr, axis=1)
+
+        # Foreground count per resized column and resized row
+
+        count_arrr = numpy.add.reduceat(col_count_arrr, col_lim_arr[:-1], axis=0)
+        area_arrr = numpy.diff(col_lim_arr)[:, None] * numpy.diff(row_lim_arr)[None, :]
+
+        new_mask_flat = (count_arrr > threshold * area_arrr).ravel()
+
+    else:
+
+        raise ValueError("Invalid mode \"{:s}\". Expected \"nearest\" or \"majority\"".format(mode))
+
+    new_mask = new_mask_flat.reshape((new_mask_h, new_mask_w), order="F")
+
+    return goripy.mask.rle.mask_to_rle(new_mask)
+
+
+
+def _nearest_src_idxs(
+    src_size,
+    dst_size
+):
+
+    src_idx_arr = numpy.floor((numpy.arange(dst_size) + 0.5) * (src_size / dst_size))
+
+    return numpy.minimum(src_idx_arr.astype(numpy.int64), src_size - 1)
@@ -1,5 +1,7 @@
 import numpy
 
+import goripy.mask.bbox
+
 
 
 def mask_to_rle(mask):
@@ -69,3 +71,476 @@ def rle_to_mask(rle, shape):
         mask_flat[idx_1:idx_2] = 1
     
     return mask_flat.reshape(shape, order='F')
+
+
+
+def rle_to_runs(rle):
+    """
+    Computes the foreground runs of an RLE encoded mask.
+
+    Run limits are given as positions in the column-major flattened mask.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+    Returns:
+
+        2-tuple of numpy.ndarray:
+            Two 1D numpy arrays with each foreground run starting (inclusive) and ending
+            (exclusive) positions.
+    """
+
+    num_fg_runs = rle.shape[0] // 2
+    rle_cum = numpy.cumsum(rle, dtype=numpy.int64)
+
+    run_start_arr = rle_cum[0:2*num_fg_runs:2]
+    run_end_arr = rle_cum[1:2*num_fg_runs:2]
+
+    nonempty_run_arr = run_end_arr > run_start_arr
+
+    return run_start_arr[nonempty_run_arr], run_end_arr[nonempty_run_arr]
+
+
+
+def runs_to_rle(run_start_arr, run_end_arr, size):
+    """
+    Encodes foreground runs into RLE. Inverse of `rle_to_runs`.
+
+    Args:
+
+        run_start_arr (numpy.ndarray):
+            1D numpy array with each foreground run starting position (inclusive).
+            Runs must be sorted and must not overlap.
+
+        run_end_arr (numpy.ndarray):
+            1D numpy array with each foreground run ending position (exclusive).
+
+        size (int):
+            Total number of pixels of the mask (H * W).
+
+    Returns:
+
+        numpy.ndarray:
+            The encoded RLE as an array.
+            Dtype: uint32.
+    """
+
+    run_start_arr = numpy.asarray(run_start_arr, dtype=numpy.int64)
+    run_end_arr = numpy.asarray(run_end_arr, dtype=numpy.int64)
+
+    nonempty_run_arr = run_end_arr > run_start_arr
+    run_start_arr = run_start_arr[nonempty_run_arr]
+    run_end_arr = run_end_arr[nonempty_run_arr]
+
+    # Merge touching runs
+
+    if run_start_arr.shape[0] > 0:
+        is_sep_arr = run_start_arr[1:] != run_end_arr[:-1]
+        run_start_arr = run_start_arr[numpy.concatenate([[True], is_sep_arr])]
+        run_end_arr = run_end_arr[numpy.concatenate([is_sep_arr, [True]])]
+
+    lim_arr = numpy.empty(shape=(2 * run_start_arr.shape[0] + 2), dtype=numpy.int64)
+    lim_arr[0] = 0
+    lim_arr[1:-1:2] = run_start_arr
+    lim_arr[2:-1:2] = run_end_arr
+    lim_arr[-1] = size
+
+    rle = numpy.diff(lim_arr).astype(numpy.uint32)
+
+    if rle.shape[0] > 1 and rle[-1] == 0:
+        rle = rle[:-1]
+
+    return rle
+
+
+
+def rle_to_col_segments(rle, shape):
+    """
+    Splits the foreground runs of an RLE encoded mask into per-column segments.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+        shape (2-tuple of int):
+            The original dimensions of the mask (H x W).
+
+    Returns:
+
+        3-tuple of numpy.ndarray:
+            Three 1D numpy arrays with each segment column, starting row (inclusive) and ending
+            row (exclusive). Segments are sorted in column-major order.
+    """
+
+    mask_h = int(shape[0])
+    run_start_arr, run_end_arr = rle_to_runs(rle)
+
+    run_col0_arr = run_start_arr // mask_h
+    run_num_cols_arr = (run_end_arr - 1) // mask_h - run_col0_arr + 1
+
+    seg_run_idx_arr = numpy.repeat(numpy.arange(run_start_arr.shape[0]), run_num_cols_arr)
+    seg_run_pos_arr = numpy.arange(seg_run_idx_arr.shape[0]) -\
+        numpy.repeat(numpy.cumsum(run_num_cols_arr) - run_num_cols_arr, run_num_cols_arr)
+
+    seg_col_arr = run_col0_arr[seg_run_idx_arr] + seg_run_pos_arr
+    seg_row0_arr = numpy.maximum(run_start_arr[seg_run_idx_arr] - seg_col_arr * mask_h, 0)
+    seg_row1_arr = numpy.minimum(run_end_arr[seg_run_idx_arr] - seg_col_arr * mask_h, mask_h)
+
+    return seg_col_arr, seg_row0_arr, seg_row1_arr
+
+
+
+def col_segments_to_rle(seg_col_arr, seg_row0_arr, seg_row1_arr, shape):
+    """
+    Encodes per-column foreground segments into RLE. Inverse of `rle_to_col_segments`.
+
+    Args:
+
+        seg_col_arr (numpy.ndarray):
+            1D numpy array with each segment column.
+
+        seg_row0_arr (numpy.ndarray):
+            1D numpy array with each segment starting row (inclusive).
+
+        seg_row1_arr (numpy.ndarray):
+            1D numpy array with each segment ending row (exclusive).
+            Segments must be sorted in column-major order and must not overlap.
+
+        shape (2-tuple of int):
+            The dimensions of the mask (H x W).
+
+    Returns:
+
+        numpy.ndarray:
+            The encoded RLE as an array.
+            Dtype: uint32.
+    """
+
+    mask_h = int(shape[0])
+    seg_col_arr = numpy.asarray(seg_col_arr, dtype=numpy.int64)
+
+    return runs_to_rle(
+        seg_col_arr * mask_h + seg_row0_arr,
+        seg_col_arr * mask_h + seg_row1_arr,
+        mask_h * int(shape[1])
+    )
+
+
+
+########
+
+
+
+def mask_to_crop_rle(mask):
+    """
+    Encodes a binary mask into bbox-cropped RLE.
+
+    Only the mask area inside the mask bbox is encoded, so that decoding cost is proportional to
+    the object size instead of the full mask size.
+
+    Args:
+
+        mask (numpy.ndarray):
+            The mask to encode.
+            Shape: (H x W). Dtype: bool.
+
+    Returns:
+
+        tuple:
+            A 2-tuple consisting of:
+
+              - `crop_rle`: The RLE of the cropped mask, as an array. Dtype: uint32.
+              - `bbox`: The bbox limits (x0, y0, x1, y1) of the crop.
+    """
+
+    x0, y0, x1, y1 = goripy.mask.bbox.mask_to_bbox(mask)
+
+    if x1 == x0:
+        return numpy.zeros(shape=(0), dtype=numpy.uint32), (0, 0, 0, 0)
+
+    return mask_to_rle(mask[y0:y1, x0:x1]), (x0, y0, x1, y1)
+
+
+
+def crop_rle_to_mask(crop_rle, bbox, shape=None):
+    """
+    Decodes a binary mask from bbox-cropped RLE.
+
+    Args:
+
+        crop_rle (numpy.ndarray):
+            The RLE of the cropped mask, as an array.
+            Dtype: uint32.
+
+        bbox (4-tuple of int):
+            The bbox limits (x0, y0, x1, y1) of the crop.
+
+        shape (2-tuple of int, optional):
+            The original dimensions of the mask (H x W).
+            If provided, the full mask is decoded. Otherwise, only the crop is decoded.
+
+    Returns:
+
+        numpy.ndarray:
+            The decoded mask.
+            Shape: (H x W), or (y1 - y0 x x1 - x0) if `shape` is not provided. Dtype: bool.
+    """
+
+    x0, y0, x1, y1 = bbox
+    crop_mask = rle_to_mask(crop_rle, (y1 - y0, x1 - x0))
+
+    if shape is None:
+        return crop_mask
+
+    mask = numpy.zeros(shape=shape, dtype=bool)
+    mask[y0:y1, x0:x1] = crop_mask
+
+    return mask
+
+
+
+def rle_to_crop_rle(rle, shape):
+    """
+    Converts full RLE into bbox-cropped RLE, without decoding the mask.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+        shape (2-tuple of int):
+            The original dimensions of the mask (H x W).
+
+    Returns:
+
+        tuple:
+            A 2-tuple consisting of:
+
+              - `crop_rle`: The RLE of the cropped mask, as an array. Dtype: uint32.
+              - `bbox`: The bbox limits (x0, y0, x1, y1) of the crop.
+    """
+
+    seg_col_arr, seg_row0_arr, seg_row1_arr = rle_to_col_segments(rle, shape)
+
+    if seg_col_arr.shape[0] == 0:
+        return numpy.zeros(shape=(0), dtype=numpy.uint32), (0, 0, 0, 0)
+
+    x0, x1 = seg_col_arr[0].item(), seg_col_arr[-1].item() + 1
+    y0, y1 = numpy.min(seg_row0_arr).item(), numpy.max(seg_row1_arr).item()
+
+    crop_rle = col_segments_to_rle(
+        seg_col_arr - x0,
+        seg_row0_arr - y0,
+        seg_row1_arr - y0,
+        (y1 - y0, x1 - x0)
+    )
+
+    return crop_rle, (x0, y0, x1, y1)
+
+
+
+def crop_rle_to_rle(crop_rle, bbox, shape):
+    """
+    Converts bbox-cropped RLE into full RLE, without decoding the mask.
+    Inverse of `rle_to_crop_rle`.
+
+    Args:
+
+        crop_rle (numpy.ndarray):
+            The RLE of the cropped mask, as an array.
+            Dtype: uint32.
+
+        bbox (4-tuple of int):
+            The bbox limits (x0, y0, x1, y1) of the crop.
+
+        shape (2-tuple of int):
+            The original dimensions of the mask (H x W).
+
+    Returns:
+
+        numpy.ndarray:
+            The encoded RLE as an array.
+            Dtype: uint32.
+    """
+
+    x0, y0, x1, y1 = bbox
+
+    seg_col_arr, seg_row0_arr, seg_row1_arr = rle_to_col_segments(crop_rle, (y1 - y0, x1 - x0))
+
+    return col_segments_to_rle(
+        seg_col_arr + x0,
+        seg_row0_arr + y0,
+        seg_row1_arr + y0,
+        shape
+    )
+
+
+
+def rle_count_before(rle, pos_arr):
+    """
+    Counts the foreground pixels before given positions of an RLE encoded mask.
+
+    Positions refer to the column-major flattened mask.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+        pos_arr (numpy.ndarray):
+            Array with the positions to count foreground pixels before.
+
+    Returns:
+
+        numpy.ndarray:
+            Array with the same shape as `pos_arr` with the number of foreground pixels in the
+            [0, pos) range for each position.
+    """
+
+    run_start_arr, run_end_arr = rle_to_runs(rle)
+    run_cum_len_arr = numpy.concatenate([
+        numpy.asarray([0], dtype=numpy.int64),
+        numpy.cumsum(run_end_arr - run_start_arr)
+    ])
+
+    pos_arr = numpy.asarray(pos_arr, dtype=numpy.int64)
+
+    if run_start_arr.shape[0] == 0:
+        return numpy.zeros(shape=pos_arr.shape, dtype=numpy.int64)
+
+    # Index of the last run starting before each position
+
+    run_idx_arr = numpy.searchsorted(run_start_arr, pos_arr, side="right") - 1
+    run_idx_clip_arr = numpy.maximum(run_idx_arr, 0)
+
+    in_run_len_arr = numpy.clip(
+        pos_arr - run_start_arr[run_idx_clip_arr],
+        0,
+        run_end_arr[run_idx_clip_arr] - run_start_arr[run_idx_clip_arr]
+    )
+
+    return numpy.where(
+        run_idx_arr >= 0,
+        run_cum_len_arr[run_idx_clip_arr] + in_run_len_arr,
+        0
+    )
+
+
+
+def rle_contains(rle, pos_arr):
+    """
+    Checks whether given positions of an RLE encoded mask are foreground.
+
+    Positions refer to the column-major flattened mask.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+        pos_arr (numpy.ndarray):
+            Array with the positions to check.
+
+    Returns:
+
+        numpy.ndarray:
+            Boolean array with the same shape as `pos_arr`.
+    """
+
+    rle_cum = numpy.cumsum(rle, dtype=numpy.int64)
+
+    return numpy.searchsorted(rle_cum, pos_arr, side="right") % 2 == 1
+
+
+
+def rle_to_bbox(rle, shape):
+    """
+    Computes bbox limits from an RLE encoded mask, without decoding it.
+    Empty masks yield (0, 0, 0, 0) limits.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+        shape (2-tuple of int):
+            The original dimensions of the mask (H x W).
+
+    Returns:
+
+        tuple of int:
+            The bbox limits (x0, y0, x1, y1).
+    """
+
+    seg_col_arr, seg_row0_arr, seg_row1_arr = rle_to_col_segments(rle, shape)
+
+    if seg_col_arr.shape[0] == 0:
+        return 0, 0, 0, 0
+
+    return (
+        seg_col_arr[0].item(),
+        numpy.min(seg_row0_arr).item(),
+        seg_col_arr[-1].item() + 1,
+        numpy.max(seg_row1_arr).item()
+    )
+
+
+
+def rle_area(rle):
+    """
+    Computes the number of foreground pixels of an RLE encoded mask.
+
+    Args:
+
+        rle (numpy.ndarray):
+            The encoded RLE as an array.
+            Dtype: uint32.
+
+    Returns:
+
+        int:
+            The mask area.
+    """
+
+    return int(numpy.sum(rle[1::2], dtype=numpy.int64))
+
+
+
+def rle_iou(rle_1, rle_2):
+    """
+    Computes the Intersection over Union of two RLE encoded masks of the same shape, without
+    decoding them. IoU between two empty masks is 0.
+
+    Args:
+
+        rle_1 (numpy.ndarray):
+            The first encoded RLE as an array.
+            Dtype: uint32.
+
+        rle_2 (numpy.ndarray):
+            The second encoded RLE as an array.
+            Dtype: uint32.
+
+    Returns:
+
+        float:
+            The IoU value.
+    """
+
+    run_start_arr, run_end_arr = rle_to_runs(rle_1)
+
+    inter = int(numpy.sum(
+        rle_count_before(rle_2, run_end_arr) - rle_count_before(rle_2, run_start_arr)
+    ))
+    union = rle_area(rle_1) + rle_area(rle_2) - inter
+
+    return inter / max(union, 1)
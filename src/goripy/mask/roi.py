@@ -0,0 +1,253 @@
+import concurrent.futures
+
+import numpy
+
+import goripy.args
+import goripy.array.chunk
+import goripy.mask.packed
+import goripy.mask.rle
+
+
+
+########
+
+
+
+def crop_and_resize_masks(
+    masks,
+    box_arr,
+    out_size=28,
+    out_arr=None,
+    shape=None,
+    mode="bilinear",
+    threshold=None,
+    num_threads=None
+):
+    """
+    Crops binary masks to boxes and resizes the crops to a fixed size, e.g. to build mask head
+    training targets.
+
+    Each output pixel samples its mask at the output pixel center mapped into the box, so that
+    box limits refer to pixel edges, as the (x0, y0, x1, y1) bboxes of `goripy.mask.bbox`.
+    Samples outside the mask are background.
+    Only the sampled pixels are read, so RLE and bit-packed masks are never fully decoded.
+
+    Args:
+
+        masks (numpy.ndarray, goripy.mask.packed.BitPackedMask or list of numpy.ndarray):
+            Masks to crop. Either a dense (N x H x W) boolean array, a (N x H x W) stack of
+            bit-packed masks, or a list of N RLE encoded masks (see `goripy.mask.rle`).
+
+        box_arr (numpy.ndarray):
+            Crop boxes (x0, y0, x1, y1) of each mask.
+            Shape: (N x 4).
+
+        out_size (int or 2-tuple of int, optional):
+            Size of the resized crops (M) or (M_h x M_w). Ignored if `out_arr` is provided.
+            Defaults to 28.
+
+        out_arr (numpy.ndarray, optional):
+            Preallocated output array, filled in place.
+            Shape: (N x M_h x M_w).
+            If None, a new array is allocated, with `float32` dtype for bilinear resizing
+            without threshold and `bool` dtype otherwise.
+            Defaults to None.
+
+        shape (2-tuple of int, optional):
+            The original dimensions of the masks (H x W). Required for RLE encoded masks.
+            Defaults to None.
+
+        mode (str, optional):
+            Sampling mode. Either "bilinear" or "nearest".
+            Defaults to "bilinear".
+
+        threshold (float, optional):
+            If provided, bilinear samples are binarized as `value >= threshold`.
+            Defaults to None.
+
+        num_threads (int, optional):
+            Number of threads to process masks with. If None, masks are processed in the calling
+            thread.
+            Defaults to None.
+
+    Returns:
+
+        numpy.ndarray:
+            The resized crops, i.e. `out_arr` if provided.
+            Shape: (N x M_h x M_w).
+    """
+
+    if mode not in ("bilinear", "nearest"):
+        raise ValueError("Invalid mode \"{:s}\". Expected \"bilinear\" or \"nearest\"".format(
+            mode
+        ))
+
+    gather_fn, num_masks, mask_h, mask_w = _get_mask_gather_fn(masks, shape)
+
+    box_arr = numpy.asarray(box_arr, dtype=numpy.float64).reshape(num_masks, 4)
+
+    if out_arr is None:
+        out_h, out_w = goripy.args.arg_list_to_arg_arr(out_size, 2, int).tolist()
+        out_dtype = numpy.float32 if mode == "bilinear" and threshold is None else bool
+        out_arr = numpy.empty(shape=(num_masks, out_h, out_w), dtype=out_dtype)
+
+    if out_arr.ndim != 3 or out_arr.shape[0] != num_masks:
+        raise ValueError("Output array shape {:s} does not match {:d} masks".format(
+            str(out_arr.shape),
+            num_masks
+        ))
+
+    def process_chunk(mask_idxs):
+        for mask_idx in mask_idxs.tolist():
+            out_arr[mask_idx] = _crop_and_resize_mask(
+                gather_fn,
+                mask_idx,
+                box_arr[mask_idx],
+                mask_h,
+                mask_w,
+                out_arr.shape[1:],
+                mode,
+                threshold
+            )
+
+    if num_threads is None or num_masks == 0:
+
+        process_chunk(numpy.arange(num_masks))
+
+    else:
+
+        mask_idxs_list = goripy.array.chunk.chunk_partition_num(
+            numpy.arange(num_masks),
+            min(num_threads, num_masks)
+        )
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+            for _ in executor.map(process_chunk, mask_idxs_list):
+                pass
+
+    return out_arr
+
+
+
+########
+
+
+
+def _get_mask_gather_fn(
+    masks,
+    shape
+):
+
+    if isinstance(masks, goripy.mask.packed.BitPackedMask):
+
+        if not masks.is_stack():
+            raise ValueError("Expected a stack of bit-packed masks (N x H x W)")
+
+        packed_arr = masks.packed_arr
+
+        def gather_fn(mask_idx, row_arr, col_arr):
+            byte_arr = packed_arr[mask_idx, row_arr, col_arr >> 3]
+            return (byte_arr >> (7 - (col_arr & 7)).astype(numpy.uint8)) & 1 == 1
+
+        return gather_fn, masks.shape[0], masks.shape[1], masks.shape[2]
+
+    if isinstance(masks, numpy.ndarray):
+
+        def gather_fn(mask_idx, row_arr, col_arr):
+            return masks[mask_idx, row_arr, col_arr].astype(bool)
+
+        return gather_fn, masks.shape[0], masks.shape[1], masks.shape[2]
+
+    if shape is None:
+        raise ValueError("Mask shape is required for RLE encoded masks")
+
+    mask_h, mask_w = int(shape[0]), int(shape[1])
+
+    def gather_fn(mask_idx, row_arr, col_arr):
+        return goripy.mask.rle.rle_contains(masks[mask_idx], col_arr * mask_h + row_arr)
+
+    return gather_fn, len(masks), mask_h, mask_w
+
+
+
+def _crop_and_resize_mask(
+    gather_fn,
+    mask_idx,
+    box,
+    mask_h,
+    mask_w,
+    out_shape,
+    mode,
+    threshold
+):
+
+    out_h, out_w = out_shape
+    x0, y0, x1, y1 = box.tolist()
+
+    # Output pixel centers in original pixel center coordinates
+
+    y_arr = y0 + (numpy.arange(out_h) + 0.5) * (y1 - y0) / out_h - 0.5
+    x_arr = x0 + (numpy.arange(out_w) + 0.5) * (x1 - x0) / out_w - 0.5
+
+    if mode == "nearest":
+
+        row_arr = numpy.floor(y_arr + 0.5).astype(numpy.int64)
+        col_arr = numpy.floor(x_arr + 0.5).astype(numpy.int64)
+
+        return _gather_grid(gather_fn, mask_idx, row_arr, col_arr, mask_h, mask_w)
+
+    row0_arr = numpy.floor(y_arr).astype(numpy.int64)
+    col0_arr = numpy.floor(x_arr).astype(numpy.int64)
+
+    wy_arr = y_arr - row0_arr
+    wx_arr = x_arr - col0_arr
+
+    val_arrr = _gather_grid(
+        gather_fn,
+        mask_idx,
+        numpy.concatenate([row0_arr, row0_arr + 1]),
+        numpy.concatenate([col0_arr, col0_arr + 1]),
+        mask_h,
+        mask_w
+    ).astype(numpy.float32)
+
+    val_left_arrr = val_arrr[:, :out_w] * (1 - wx_arr[None, :])
+    val_right_arrr = val_arrr[:, out_w:] * wx_arr[None, :]
+    val_interp_arrr = val_left_arrr + val_right_arrr
+
+    res_arrr = \
+        val_interp_arrr[:out_h] * (1 - wy_arr[:, None]) +\
+        val_interp_arrr[out_h:] * wy_arr[:, None]
+
+    if threshold is not None:
+        return res_arrr >= threshold
+
+    return res_arrr
+
+
+
+def _gather_grid(
+    gather_fn,
+    mask_idx,
+    row_arr,
+    col_arr,
+    mask_h,
+    mask_w
+):
+
+    is_valid_row_arr = (row_arr >= 0) & (row_arr < mask_h)
+    is_valid_col_arr = (col_arr >= 0) & (col_arr < mask_w)
+
+    val_arrr = numpy.zeros(shape=(row_arr.shape[0], col_arr.shape[0]), dtype=bool)
+
+    valid_row_arr = row_arr[is_valid_row_arr]
+    valid_col_arr = col_arr[is_valid_col_arr]
+
+    if valid_row_arr.shape[0] > 0 and valid_col_arr.shape[0] > 0:
+        val_arrr[numpy.ix_(is_valid_row_arr, is_valid_col_arr)] = gather_fn(
+            mask_idx,
+            valid_row_arr[:, None],
+            valid_col_arr[None, :]
+        )
+
+    return val_arrr
@@ -0,0 +1,686 @@
+import itertools
+
+import numpy
+
+import goripy.array.list
+import goripy.dict.depth
+from goripy.store.varlen2dlist import VariableLength2DListStorage
+
+
+
+########
+
+
+
+class RecordColumnStorage:
+    """
+    Stores a list of nested dict records in a columnar (struct-of-arrays) layout.
+
+    Each leaf path of the records (see `goripy.dict.depth.flatten_paths`) becomes a column:
+
+    - Boolean, integer and float fields are stored as 1D numpy arrays.
+    - String fields are stored as `StringColumn` objects (codes into a vocabulary).
+    - List fields of booleans or numbers are stored as `VariableLength2DListStorage` objects.
+    - Any other field is stored as a 1D numpy array with `object` dtype. This includes fields
+      mixing integers and floats, which keep their exact Python values.
+
+    Records missing a field get a zero (empty string or empty list) placeholder, and are flagged
+    in the column missing mask.
+    Indexing this object returns a `RecordView` of a single record.
+
+    Args:
+
+        column_dict (dict):
+            Dict mapping each leaf path (tuple of keys) to its column.
+
+        missing_dict (dict):
+            Dict mapping leaf paths to 1D boolean numpy arrays flagging records without the
+            field. Paths not in this dict are present in all records.
+
+        num_records (int):
+            Number of stored records.
+    """
+
+
+    def __init__(
+        self,
+        column_dict,
+        missing_dict,
+        num_records
+    ):
+
+        self._column_dict = column_dict
+        self._missing_dict = missing_dict
+        self._num_records = num_records
+
+
+    def __len__(
+        self
+    ):
+
+        return self._num_records
+
+
+    def __getitem__(
+        self,
+        idx
+    ):
+
+        if idx < 0:
+            idx += self._num_records
+
+        if not 0 <= idx < self._num_records:
+            raise IndexError("Record index {:d} out of range".format(idx))
+
+        return RecordView(self, idx)
+
+
+    @property
+    def paths(
+        self
+    ):
+        """
+        list of tuple: Leaf paths of all columns.
+        """
+
+        return list(self._column_dict.keys())
+
+
+    @classmethod
+    def from_records(
+        cls,
+        records
+    ):
+        """
+        Creates a RecordColumnStorage from a list of nested dict records.
+
+        Args:
+
+            records (list of dict):
+                Records to store.
+
+        Returns:
+
+            RecordColumnStorage:
+                The created storage object.
+        """
+
+        num_records = len(records)
+
+        path_value_list_dict = {}
+
+        for record_idx, record in enumerate(records):
+            for path, value in goripy.dict.depth.flatten_paths(record).items():
+
+                value_list = path_value_list_dict.get(path)
+
+                if value_list is None:
+                    value_list = path_value_list_dict[path] = [_MISSING] * record_idx
+
+                # Pad records which did not have this path
+
+                if len(value_list) < record_idx:
+                    value_list += [_MISSING] * (record_idx - len(value_list))
+
+                value_list.append(value)
+
+        column_dict = {}
+        missing_dict = {}
+
+        for path, value_list in path_value_list_dict.items():
+
+            value_list += [_MISSING] * (num_records - len(value_list))
+
+            missing_arr = numpy.fromiter(
+                (value is _MISSING for value in value_list),
+                dtype=bool,
+                count=num_records
+            )
+
+            column_dict[path] = _build_column(value_list, missing_arr)
+            if numpy.any(missing_arr):
+                missing_dict[path] = missing_arr
+
+        return cls(column_dict, missing_dict, num_records)
+
+
+    def get_column(
+        self,
+        path
+    ):
+        """
+        Gets the column of a leaf path.
+
+        Args:
+
+            path (tuple or any):
+                Leaf path, as a tuple of keys. A non-tuple value is used as a single key.
+
+        Returns:
+
+            numpy.ndarray, StringColumn or VariableLength2DListStorage:
+                The column, with one entry per record.
+        """
+
+        return self._column_dict[_to_path(path)]
+
+
+    def get_missing(
+        self,
+        path
+    ):
+        """
+        Gets the missing mask of a leaf path.
+
+        Args:
+
+            path (tuple or any):
+                Leaf path, as a tuple of keys. A non-tuple value is used as a single key.
+
+        Returns:
+
+            numpy.ndarray:
+                1D boolean numpy array, True for records without the field.
+        """
+
+        path = _to_path(path)
+
+        if path not in self._column_dict:
+            raise KeyError(path)
+
+        missing_arr = self._missing_dict.get(path)
+        if missing_arr is None:
+            missing_arr = numpy.zeros(shape=(self._num_records), dtype=bool)
+
+        return missing_arr
+
+
+    def filter(
+        self,
+        sel
+    ):
+        """
+        Creates a RecordColumnStorage with a subset of the records of this one.
+
+        Args:
+
+            sel (numpy.ndarray):
+                1D boolean numpy array selecting the records to keep, e.g. computed from
+                columns, or 1D numpy array with their indices.
+
+        Returns:
+
+            RecordColumnStorage:
+                The created storage object.
+        """
+
+        sel = numpy.asarray(sel)
+        idxs = numpy.flatnonzero(sel) if sel.dtype == bool else sel
+
+        column_dict = {
+            path:
+                column.take(idxs)
+                if isinstance(column, (StringColumn, VariableLength2DListStorage)) else
+                column[idxs]
+            for path, column in self._column_dict.items()
+        }
+        missing_dict = {
+            path: missing_arr[idxs]
+            for path, missing_arr in self._missing_dict.items()
+        }
+
+        return RecordColumnStorage(column_dict, missing_dict, idxs.shape[0])
+
+
+    def get_record(
+        self,
+        idx
+    ):
+        """
+        Rebuilds a single record as a nested dict.
+
+        Args:
+
+            idx (int):
+                Index of the record.
+
+        Returns:
+
+            dict:
+                The record, with numpy scalars converted to Python values and list fields to
+                lists.
+        """
+
+        flat_record = {}
+
+        for path, column in self._column_dict.items():
+
+            missing_arr = self._missing_dict.get(path)
+            if missing_arr is not None and missing_arr[idx]:
+                continue
+
+            flat_record[path] = _get_column_value(column, idx)
+
+        return goripy.dict.depth.unflatten_paths(flat_record)
+
+
+    def to_records(
+        self
+    ):
+        """
+        Rebuilds all records as nested dicts. Inverse of `from_records`.
+
+        Returns:
+
+            list of dict:
+                The records.
+        """
+
+        return [self.get_record(idx) for idx in range(self._num_records)]
+
+
+    def get_num_bytes(
+        self
+    ):
+        """
+        Computes the RAM memory overhead of this object, excluding Python objects referenced by
+        `object` columns.
+
+        Returns:
+
+            int:
+                Number of bytes occupied by this object.
+        """
+
+        num_bytes = 0
+
+        for column in self._column_dict.values():
+            if isinstance(column, (StringColumn, VariableLength2DListStorage)):
+                num_bytes += column.get_num_bytes()
+            else:
+                num_bytes += column.nbytes
+
+        for missing_arr in self._missing_dict.values():
+            num_bytes += missing_arr.nbytes
+
+        return num_bytes
+
+
+
+class RecordView:
+    """
+    Lightweight view of a single record of a RecordColumnStorage.
+    Indexing this object with a leaf path returns the record value for that field.
+
+    Args:
+
+        storage (RecordColumnStorage):
+            The storage holding the record.
+
+        idx (int):
+            Index of the record.
+    """
+
+
+    def __init__(
+        self,
+        storage,
+        idx
+    ):
+
+        self._storage = storage
+        self._idx = idx
+
+
+    def __getitem__(
+        self,
+        path
+    ):
+
+        if self._storage.get_missing(path)[self._idx]:
+            raise KeyError(path)
+
+        return _get_column_value(self._storage.get_column(path), self._idx)
+
+
+    def get(
+        self,
+        path,
+        default=None
+    ):
+        """
+        Gets the record value for a field.
+
+        Args:
+
+            path (tuple or any):
+                Leaf path, as a tuple of keys. A non-tuple value is used as a single key.
+
+            default (any, optional):
+                Default return object.
+                Defaults to None.
+
+        Returns:
+
+            any:
+                The record value, or the default return object if the record has no such field.
+        """
+
+        try:
+            return self[path]
+        except KeyError:
+            return default
+
+
+    def to_dict(
+        self
+    ):
+        """
+        Rebuilds the record as a nested dict.
+
+        Returns:
+
+            dict:
+                The record.
+        """
+
+        return self._storage.get_record(self._idx)
+
+
+
+class StringColumn:
+    """
+    Stores a column of strings as integer codes into a vocabulary of unique strings.
+    The vocabulary is stored as concatenated UTF-8 bytes and offsets, so memory scales with the
+    number of records plus the total length of the unique strings.
+    Indexing this object returns the string of a single record.
+
+    Args:
+
+        code_arr (numpy.ndarray):
+            1D numpy array with the vocabulary index of each record.
+
+        vocab_offset_arr (numpy.ndarray):
+            1D numpy array (V + 1) with the start byte of each vocabulary string, followed by
+            the total number of bytes.
+
+        vocab_byte_arr (numpy.ndarray):
+            1D numpy array with the concatenated UTF-8 bytes of all vocabulary strings.
+            Dtype: uint8.
+    """
+
+
+    def __init__(
+        self,
+        code_arr,
+        vocab_offset_arr,
+        vocab_byte_arr
+    ):
+
+        self._code_arr = code_arr
+        self._vocab_offset_arr = vocab_offset_arr
+        self._vocab_byte_arr = vocab_byte_arr
+
+
+    def __len__(
+        self
+    ):
+
+        return self._code_arr.shape[0]
+
+
+    def __getitem__(
+        self,
+        idx
+    ):
+
+        return self._get_vocab_str(self._code_arr[idx].item())
+
+
+    @property
+    def code_arr(
+        self
+    ):
+        """
+        numpy.ndarray: 1D numpy array with the vocabulary index of each record.
+        """
+
+        return self._code_arr
+
+
+    @property
+    def vocab_list(
+        self
+    ):
+        """
+        list of str: Unique strings, in order of first appearance.
+        """
+
+        return [
+            self._get_vocab_str(code)
+            for code in range(self._vocab_offset_arr.shape[0] - 1)
+        ]
+
+
+    @classmethod
+    def from_list(
+        cls,
+        value_list
+    ):
+        """
+        Creates a StringColumn from a list of strings.
+
+        Args:
+
+            value_list (list of str):
+                Strings to store.
+
+        Returns:
+
+            StringColumn:
+                The created column object.
+        """
+
+        code_dict = {}
+        code_arr = numpy.fromiter(
+            (code_dict.setdefault(value, len(code_dict)) for value in value_list),
+            dtype=numpy.int64,
+            count=len(value_list)
+        )
+        code_arr = code_arr.astype(numpy.min_scalar_type(max(len(code_dict) - 1, 0)))
+
+        vocab_bytes_list = [value.encode("utf-8") for value in code_dict.keys()]
+        vocab_offset_arr = numpy.zeros(shape=(len(vocab_bytes_list) + 1), dtype=numpy.int64)
+        vocab_offset_arr[1:] = numpy.cumsum([len(value_bytes) for value_bytes in vocab_bytes_list])
+        vocab_byte_arr = numpy.frombuffer(b"".join(vocab_bytes_list), dtype=numpy.uint8)
+
+        return cls(code_arr, vocab_offset_arr, vocab_byte_arr)
+
+
+    def take(
+        self,
+        idxs
+    ):
+        """
+        Creates a StringColumn with a subset of the records of this one, sharing its vocabulary.
+
+        Args:
+
+            idxs (numpy.ndarray):
+                1D numpy array with the indices of the records to take, or a boolean selection
+                array.
+
+        Returns:
+
+            StringColumn:
+                The created column object.
+        """
+
+        return StringColumn(self._code_arr[idxs], self._vocab_offset_arr, self._vocab_byte_arr)
+
+
+    def isin(
+        self,
+        value_list
+    ):
+        """
+        Checks which records hold any of the given strings, comparing codes only.
+
+        Args:
+
+            value_list (list of str):
+                Strings to look for.
+
+        Returns:
+
+            numpy.ndarray:
+                1D boolean numpy array, True for records holding one of the strings.
+        """
+
+        vocab_code_dict = {value: code for code, value in enumerate(self.vocab_list)}
+        code_list = [vocab_code_dict[value] for value in value_list if value in vocab_code_dict]
+
+        return numpy.isin(self._code_arr, numpy.asarray(code_list, dtype=self._code_arr.dtype))
+
+
+    def get_num_bytes(
+        self
+    ):
+        """
+        Computes the RAM memory overhead of this object.
+
+        Returns:
+
+            int:
+                Number of bytes occupied by this object.
+        """
+
+        num_bytes = 0
+
+        num_bytes += self._code_arr.nbytes
+        num_bytes += self._vocab_offset_arr.nbytes
+        num_bytes += self._vocab_byte_arr.nbytes
+
+        return num_bytes
+
+
+    def _get_vocab_str(
+        self,
+        code
+    ):
+
+        vocab_start = self._vocab_offset_arr[code]
+        vocab_end = self._vocab_offset_arr[code + 1]
+
+        return self._vocab_byte_arr[vocab_start:vocab_end].tobytes().decode("utf-8")
+
+
+
+########
+
+
+
+_MISSING = object()
+
+
+
+def _to_path(
+    path
+):
+
+    return path if isinstance(path, tuple) else (path,)
+
+
+
+def _get_column_value(
+    column,
+    idx
+):
+
+    value = column[idx]
+
+    if isinstance(column, VariableLength2DListStorage):
+        return value.tolist()
+
+    if isinstance(value, numpy.generic):
+        return value.item()
+
+    return value
+
+
+
+def _build_column(
+    value_list,
+    missing_arr
+):
+
+    present_value_list = [value for value in value_list if value is not _MISSING]
+
+    # List fields of booleans or numbers
+
+    if all(isinstance(value, list) for value in present_value_list):
+
+        value_llist = [[] if value is _MISSING else value for value in value_list]
+        flat_value_arr = _try_scalar_arr(list(itertools.chain.from_iterable(value_llist)))
+
+        if flat_value_arr is not None:
+
+            value_arrr = goripy.array.list.llist_to_arrr(
+                value_llist,
+                flat_value_arr.dtype,
+                arrr_inv_val=numpy.zeros(shape=(), dtype=flat_value_arr.dtype).item()
+            )
+            value_len_arr = numpy.fromiter(map(len, value_llist), dtype=numpy.int64)
+
+            return VariableLength2DListStorage(value_arrr, value_len_arr)
+
+    # String fields
+
+    if all(isinstance(value, str) for value in present_value_list):
+
+        return StringColumn.from_list(["" if value is _MISSING else value for value in value_list])
+
+    # Boolean and number fields
+
+    value_arr = _try_scalar_arr(present_value_list)
+
+    if value_arr is not None:
+
+        column_arr = numpy.zeros(shape=(len(value_list)), dtype=value_arr.dtype)
+        column_arr[~missing_arr] = value_arr
+
+        return column_arr
+
+    # Any other field
+
+    column_arr = numpy.empty(shape=(len(value_list)), dtype=object)
+    for idx, value in enumerate(value_list):
+        column_arr[idx] = None if value is _MISSING else value
+
+    return column_arr
+
+
+
+def _try_scalar_arr(
+    value_list
+):
+
+    # Values must be all booleans, all integers or all floats, to avoid implicit conversions
+
+    value_type_set = {
+        bool if isinstance(value, bool) else
+        int if isinstance(value, int) else
+        float if isinstance(value, float) else
+        None
+        for value in value_list
+    }
+
+    if None in value_type_set or len(value_type_set) > 1:
+        return None
+
+    value_arr = numpy.asarray(value_list)
+
+    if value_arr.dtype == object:
+        return None
+
+    return value_arr
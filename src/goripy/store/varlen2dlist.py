@@ -43,6 +43,38 @@ class VariableLength2DListStorage:
         return self._value_arrr[idx, :self._value_len_arr[idx]]
 
 
+    def __len__(
+        self
+    ):
+
+        return self._value_len_arr.shape[0]
+
+
+    def take(
+        self,
+        idxs
+    ):
+        """
+        Creates a VariableLength2DListStorage with a subset of the rows of this one.
+
+        Args:
+
+            idxs (numpy.ndarray):
+                1D numpy array with the indices of the rows to take, or a boolean selection
+                array.
+
+        Returns:
+
+            VariableLength2DListStorage:
+                The created storage object.
+        """
+
+        value_len_arr = self._value_len_arr[idxs]
+        max_value_len = int(numpy.max(value_len_arr, initial=0))
+
+        return VariableLength2DListStorage(self._value_arrr[idxs, :max_value_len], value_len_arr)
+
+
     @classmethod
     def from_2d_list(
         cls,
@@ -183,6 +215,21 @@ class VariableLength2DListStorage:
         return num_bytes
 
 
+    def get_item_num_bytes(
+        self
+    ):
+        """
+        Computes the number of bytes of the valid values of each row, excluding padding.
+
+        Returns:
+
+            numpy.ndarray:
+                1D numpy array with the number of bytes of each row.
+        """
+
+        return self._value_len_arr.astype(numpy.int64) * self._value_arrr.dtype.itemsize
+
+
 
 ########
 